@@ -0,0 +1,282 @@
+"""Benchmarks for the dashboard callbacks and the distance engines.
+
+Each callback is called directly (no browser) on the bundled country data
+and on synthetic datasets of 1k, 10k and 100k units with the same schema.
+Every dataset runs in its own subprocess with GREEN_SWAN_DATA_DIR pointing
+at it, so module-level state and caches never leak between sizes.
+
+Reported per benchmark: latency of the first call, percentiles of the
+following calls (p50/p90/p99), peak traced memory of one call and the
+JSON payload a callback would send. Request-path
+benchmarks must also stay within a per-request allocation budget
+(ALLOCATION_BUDGET); a run that exceeds it exits non-zero.
+
+    python benchmark.py                          # countries + 1k, 10k, 100k
+    python benchmark.py --sizes 1000 --repeat 50
+    python benchmark.py --output new.json --compare old.json
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_FILES = ("cluster.csv", "bubble_filling.csv", "IdealpointsJuly2025.csv")
+DEFAULT_SIZES = (1000, 10000, 100000)
+
+FEATURES = {
+    'macro': ["Sovereign risk"],
+    'nature': ["Biocapacity", "Renewable_value_scaled", "Mineral_value_scaled"],
+    'green': ["BLI_scaled", "GCP_scaled"],
+    'climate': ["IMF-Adapted Readiness score_scaled", "Vulnerability score_scaled"]
+}
+
+# Peak traced bytes allowed for one request: fixed overhead + bytes per unit.
+# Cold model fits are excluded; everything a user request hits is covered.
+ALLOCATION_BUDGET = (1_000_000, 200)
+BUDGETED = ('compute_clusters[warm]', 'update_', 'highlight_patch', 'explorer_patch')
+
+
+# -----------------------------
+# Synthetic datasets
+# -----------------------------
+def _jitter(df, rng):
+    """Multiplicative noise on numeric columns, keeping missing values missing."""
+    df = df.copy()
+    for col in df.select_dtypes('number').columns:
+        df[col] = df[col] * rng.lognormal(0.0, 0.1, size=len(df))
+    return df
+
+
+def make_dataset(n_units, out_dir, seed=0):
+    """Write cluster/bubble/ideal-point CSVs with `n_units` rows to `out_dir`.
+
+    The real countries come first (so club memberships still resolve);
+    the remaining units are resampled real rows with noise and synthetic
+    ISO codes.
+    """
+    rng = np.random.default_rng(seed)
+    cluster, bubble, ipd = (pd.read_csv(os.path.join(REPO_DIR, name)) for name in DATA_FILES)
+    cluster = cluster.drop(columns='Unnamed: 0', errors='ignore')
+    bubble = bubble.drop(columns='Unnamed: 0', errors='ignore')
+
+    n_extra = max(0, n_units - len(cluster))
+    codes = np.array([f"S{i:06d}" for i in range(n_extra)])
+
+    def grow(df, iso_col='ISO'):
+        extra = _jitter(df.iloc[rng.integers(0, len(df), n_extra)], rng)
+        extra[iso_col] = codes
+        return pd.concat([df, extra], ignore_index=True)
+
+    cluster = grow(cluster).iloc[:n_units]
+    bubble = grow(bubble)
+    ipd = grow(ipd)
+    ipd['geopolitical_distance'] = ipd['geopolitical_distance'] + rng.normal(0, 0.05, len(ipd))
+
+    os.makedirs(out_dir, exist_ok=True)
+    for df, name in zip((cluster, bubble, ipd), DATA_FILES):
+        df.to_csv(os.path.join(out_dir, name), index=name != "IdealpointsJuly2025.csv")
+    return out_dir
+
+
+# -----------------------------
+# Measurement
+# -----------------------------
+def payload_bytes(result):
+    from plotly.io.json import to_json_plotly
+    return len(to_json_plotly(result))
+
+
+def measure(name, fn, repeat, setup=None):
+    """Time `repeat` calls of `fn` after a warm-up call.
+
+    The warm-up pays lazy imports, figure validators and cache fills; it
+    is reported on its own as first_ms and kept out of the percentiles.
+    """
+    if setup is not None:
+        setup()
+    start = time.perf_counter()
+    fn()
+    first = time.perf_counter() - start
+
+    timings = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - start)
+
+    if setup is not None:
+        setup()
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    timings = np.array(timings) * 1000
+    return {
+        'name': name,
+        'repeat': repeat,
+        'first_ms': first * 1000,
+        'p50_ms': float(np.percentile(timings, 50)),
+        'p90_ms': float(np.percentile(timings, 90)),
+        'p99_ms': float(np.percentile(timings, 99)),
+        'mean_ms': float(timings.mean()),
+        'peak_mem_bytes': int(peak),
+        'payload_bytes': payload_bytes(result)
+    }
+
+
+def run_benchmarks(repeat):
+    """Benchmark the app as loaded from GREEN_SWAN_DATA_DIR (runs in a worker)."""
+    start = time.perf_counter()
+    import green_swan_cluster_app as gs
+    import_seconds = time.perf_counter() - start
+
+    engine = gs.clustering_engine
+    args = (4, FEATURES['macro'], FEATURES['nature'], FEATURES['green'], FEATURES['climate'])
+    store = gs.compute_clusters(*args)
+    rng = np.random.default_rng(0)
+    iso = gs.ipd_data['ISO'].to_numpy()
+    subset = iso[rng.random(len(iso)) < 0.5].tolist()
+    variable = next(iter(gs.explorer_fragments))
+
+    results = [
+        measure('compute_clusters[cold]', lambda: gs.compute_clusters(*args), repeat, setup=engine.clear),
+        measure('compute_clusters[warm]', lambda: gs.compute_clusters(*args), repeat),
+        measure('update_clusters[highlight]', lambda: gs.update_clusters(store, 'highlight', 'OECD', 'Needs'), repeat),
+        measure('update_clusters[bubble]', lambda: gs.update_clusters(store, 'bubble', 'OECD', 'Needs'), repeat),
+        measure('highlight_patch', lambda: gs.highlight_patch(store, 'EU'), repeat),
+        measure('update_data_explorer', lambda: gs.update_data_explorer(variable), repeat),
+        measure('explorer_patch', lambda: gs.explorer_patch(variable), repeat),
+        measure('update_average_distance[OECD]', lambda: gs.update_average_distance('OECD'), repeat),
+        measure('update_average_distance[NGFS]', lambda: gs.update_average_distance('NGFS'), repeat),
+        measure('average_distance[half]', lambda: gs.average_distance(gs.ipd_data, subset), repeat),
+    ]
+    units = int(len(gs.cluster))
+    for b in results:
+        if b['name'].startswith(BUDGETED):
+            b['alloc_budget_bytes'] = ALLOCATION_BUDGET[0] + ALLOCATION_BUDGET[1] * units
+    return {
+        'units': units,
+        'data_hash': gs.DATA_HASH,
+        'import_seconds': import_seconds,
+        'benchmarks': results
+    }
+
+
+def run_dataset(label, data_dir, repeat):
+    env = dict(os.environ, GREEN_SWAN_DATA_DIR=data_dir,
+               GREEN_SWAN_SNAPSHOT_DIR=os.path.join(data_dir, ".snapshot"))
+    proc = subprocess.run([sys.executable, __file__, '--worker', '--repeat', str(repeat)],
+                          cwd=REPO_DIR, env=env, capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(f"benchmark worker for {label} failed:\n{proc.stderr}")
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    result['dataset'] = label
+    return result
+
+
+# -----------------------------
+# Reporting
+# -----------------------------
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_report(report):
+    for dataset in report['datasets']:
+        print(f"\n{dataset['dataset']} ({dataset['units']} units, import {dataset['import_seconds']:.2f}s)")
+        print(f"  {'benchmark':34} {'first ms':>9} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9} {'peak MB':>9} "
+              f"{'payload kB':>11}")
+        for b in dataset['benchmarks']:
+            print(f"  {b['name']:34} {b['first_ms']:9.2f} {b['p50_ms']:9.2f} {b['p90_ms']:9.2f} {b['p99_ms']:9.2f} "
+                  f"{b['peak_mem_bytes'] / 1e6:9.2f} {b['payload_bytes'] / 1e3:11.1f}")
+
+
+def over_budget(report):
+    """Benchmarks whose peak allocation exceeds their per-request budget."""
+    return [(d['dataset'], b['name'], b['peak_mem_bytes'], b['alloc_budget_bytes'])
+            for d in report['datasets'] for b in d['benchmarks']
+            if b['peak_mem_bytes'] > b.get('alloc_budget_bytes', float('inf'))]
+
+
+def compare(report, baseline, threshold):
+    """Benchmarks whose p50 grew by more than `threshold` versus `baseline`."""
+    old = {(d['dataset'], b['name']): b for d in baseline['datasets'] for b in d['benchmarks']}
+    regressions = []
+    for dataset in report['datasets']:
+        for b in dataset['benchmarks']:
+            prev = old.get((dataset['dataset'], b['name']))
+            if prev and prev['p50_ms'] > 0 and b['p50_ms'] > prev['p50_ms'] * (1 + threshold):
+                regressions.append((dataset['dataset'], b['name'], prev['p50_ms'], b['p50_ms']))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='*', default=list(DEFAULT_SIZES),
+                        help="synthetic dataset sizes (units)")
+    parser.add_argument('--no-countries', action='store_true', help="skip the bundled country data")
+    parser.add_argument('--repeat', type=int, default=20, help="timed calls per benchmark")
+    parser.add_argument('--output', default='benchmark_results.json', help="machine-readable results")
+    parser.add_argument('--compare', help="previous results file to check for regressions")
+    parser.add_argument('--threshold', type=float, default=0.2, help="allowed p50 slowdown (fraction)")
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.worker:
+        print(json.dumps(run_benchmarks(args.repeat)))
+        return 0
+
+    datasets = []
+    if not args.no_countries:
+        datasets.append(run_dataset('countries', REPO_DIR, args.repeat))
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in args.sizes:
+            data_dir = make_dataset(size, os.path.join(tmp, str(size)))
+            # Fewer repeats for the largest datasets keeps a full run short
+            repeat = max(3, args.repeat * 1000 // max(size, 1000))
+            datasets.append(run_dataset(f"synthetic-{size}", data_dir, repeat))
+
+    report = {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'git_revision': git_revision(),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'cpu_count': os.cpu_count(),
+        'datasets': datasets
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print_report(report)
+    print(f"\nResults written to {args.output}")
+
+    status = 0
+    for dataset, name, peak, budget in over_budget(report):
+        print(f"OVER BUDGET {dataset} {name}: peak {peak / 1e6:.2f} MB > {budget / 1e6:.2f} MB")
+        status = 1
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(report, json.load(f), args.threshold)
+        for dataset, name, old_ms, new_ms in regressions:
+            print(f"REGRESSION {dataset} {name}: p50 {old_ms:.2f} ms -> {new_ms:.2f} ms")
+        status = status or (1 if regressions else 0)
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,128 @@
+"""Club optimizer search kernel.
+
+Pool workers run local_search in separate processes. They import only
+this module and numpy, never green_swan_cluster_app, so a worker does
+not rebuild the app's data, club registry or layout; the arrays it
+searches are passed as arguments.
+"""
+import os
+import time
+
+import numpy as np
+
+
+def warm():
+    """No-op task that makes a pool worker start and import this module."""
+    return os.getpid()
+
+
+def pairwise_total(values):
+    """Sum of |a - b| over all pairs of `values`."""
+    x = np.sort(np.asarray(values, dtype=float))
+    weights = 2 * np.arange(len(x)) - (len(x) - 1)
+    return float(x @ weights)
+
+
+def distance_to_set(member_values, candidate_values):
+    """Sum of |c - y| over the members y, for every candidate c at once."""
+    y = np.sort(np.asarray(member_values, dtype=float))
+    c = np.asarray(candidate_values, dtype=float)
+    prefix = np.concatenate([[0.0], np.cumsum(y)])
+    below = np.searchsorted(y, c)
+    return c * below - prefix[below] + (prefix[-1] - prefix[below]) - c * (len(y) - below)
+
+
+def club_objective(selected, mean, ambition, objective):
+    score = ambition[selected].sum() if objective == 'ambition' else selected.sum()
+    return score, -(mean if mean is not None else 0.0)
+
+
+def club_mean(total, m):
+    return total / (m * (m - 1) / 2) if m >= 2 else None
+
+
+def _greedy_fill(selected, total, values, ambition, allowed, max_distance, objective, rng=None):
+    """Add feasible countries one by one until none fits the distance budget.
+
+    Size favours the candidate closest to the current members; ambition
+    favours ambition per unit of added distance. With `rng`, the pick is
+    drawn among the top three to diversify restarts.
+    """
+    if not selected.any():
+        # Empty start: a random country, or the one closest to all others
+        candidates = np.flatnonzero(allowed)
+        if len(candidates) == 0:
+            return selected, total
+        if rng is None:
+            start = candidates[np.argmin(distance_to_set(values[candidates], values[candidates]))]
+        else:
+            start = rng.choice(candidates)
+        selected[start] = True
+    while True:
+        candidates = np.flatnonzero(allowed & ~selected)
+        if len(candidates) == 0:
+            return selected, total
+        m = selected.sum()
+        added = distance_to_set(values[selected], values[candidates])
+        new_total = total + added
+        feasible = new_total / ((m + 1) * m / 2) <= max_distance
+        if not feasible.any():
+            return selected, total
+        candidates, added, new_total = candidates[feasible], added[feasible], new_total[feasible]
+        if objective == 'ambition':
+            order = np.argsort(-ambition[candidates] / (1.0 + added / max(m, 1)), kind='stable')
+        else:
+            order = np.argsort(added, kind='stable')
+        pick = order[0] if rng is None else order[rng.integers(min(3, len(order)))]
+        selected[candidates[pick]] = True
+        total = new_total[pick]
+
+
+def _repair(selected, values, required, max_distance):
+    """Drop the most distant non-required members until the club is feasible."""
+    total = pairwise_total(values[selected])
+    while selected.sum() >= 2 and club_mean(total, selected.sum()) > max_distance:
+        removable = np.flatnonzero(selected & ~required)
+        if len(removable) == 0:
+            break
+        spread = distance_to_set(values[selected], values[removable])
+        drop = removable[np.argmax(spread)]
+        selected[drop] = False
+        total -= spread.max()
+    return selected, total
+
+
+def local_search(values, ambition, seed, required, allowed, max_distance, objective, deadline, rng_seed,
+                 patience=500):
+    """Iterated local search: perturb the best club, refill greedily, keep improvements.
+
+    `deadline` is wall-clock (time.time) so that pool workers which start
+    late still stop when the caller stops waiting. The search also stops
+    once the club holds every allowed country or after `patience`
+    iterations without improvement. Returns the selected rows, their
+    pairwise total and the number of iterations run.
+    """
+    rng = np.random.default_rng(rng_seed)
+    best, best_total = _repair(seed | required, values, required, max_distance)
+    best, best_total = _greedy_fill(best, best_total, values, ambition, allowed, max_distance, objective)
+    best_key = club_objective(best, club_mean(best_total, best.sum()), ambition, objective)
+    iterations = stale = 0
+    while time.time() < deadline and stale < patience and (allowed & ~best).any():
+        iterations += 1
+        stale += 1
+        selected = best.copy()
+        removable = np.flatnonzero(selected & ~required)
+        if len(removable):
+            # Mostly small kicks, occasionally a restart from the required core
+            if rng.random() < 0.1:
+                n_drop = len(removable)
+            else:
+                n_drop = rng.integers(1, max(2, len(removable) // 5 + 1))
+            selected[rng.choice(removable, size=n_drop, replace=False)] = False
+        total = pairwise_total(values[selected])
+        selected, total = _greedy_fill(selected, total, values, ambition, allowed, max_distance, objective, rng)
+        key = club_objective(selected, club_mean(total, selected.sum()), ambition, objective)
+        if key > best_key:
+            best, best_total, best_key = selected, total, key
+            stale = 0
+    return np.flatnonzero(best), best_total, iterations
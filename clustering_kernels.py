@@ -0,0 +1,144 @@
+"""Clustering kernels run in joblib workers.
+
+Sweeps and stability runs fan these out to worker processes, which
+import only this module, numpy, scipy and scikit-learn, never
+green_swan_cluster_app, so a worker does not rebuild the app's data,
+club registry or explorer fragments. Inputs are passed as arrays.
+"""
+import numpy as np
+
+# Silhouette scores are computed on a sample of at most this many rows
+SILHOUETTE_SAMPLE = 10000
+
+
+def cluster_labels(X, n_clusters, method='kmeans', tree=None, random_state=42, backend='exact'):
+    """Labels, centroids and inertia of one clustering of X.
+
+    `backend` is 'exact' (KMeans) or 'scalable' (MiniBatchKMeans); Ward
+    cuts `tree`, building it when not given.
+    """
+    from sklearn.cluster import KMeans, MiniBatchKMeans
+    from scipy.cluster.hierarchy import linkage, fcluster
+    if method == 'ward':
+        if tree is None:
+            tree = linkage(X, method='ward')
+        # fcluster numbers clusters from 1
+        labels = fcluster(tree, t=n_clusters, criterion='maxclust') - 1
+        centroids = np.array([X[labels == c].mean(axis=0) for c in range(labels.max() + 1)])
+        inertia = float(((X - centroids[labels]) ** 2).sum())
+        return labels, centroids, inertia
+    if backend == 'scalable':
+        kmeans = MiniBatchKMeans(n_clusters=n_clusters, batch_size=1024, n_init=3, random_state=random_state)
+    else:
+        kmeans = KMeans(n_clusters=n_clusters, random_state=random_state)
+    labels = kmeans.fit_predict(X)
+    return labels, kmeans.cluster_centers_, float(kmeans.inertia_)
+
+
+def gap_references(X, n_references=10, max_rows=SILHOUETTE_SAMPLE, random_state=0):
+    """Uniform reference sets for the gap statistic.
+
+    Points are drawn uniformly in the box spanned by X along its principal
+    axes (Tibshirani, Walther and Hastie 2001), at most `max_rows` rows each.
+    """
+    rng = np.random.default_rng(random_state)
+    center = X.mean(axis=0)
+    _, _, axes = np.linalg.svd(X - center, full_matrices=False)
+    scores = (X - center) @ axes.T
+    low, high = scores.min(axis=0), scores.max(axis=0)
+    n_rows = min(len(X), max_rows)
+    return [rng.uniform(low, high, size=(n_rows, len(low))) @ axes + center for _ in range(n_references)]
+
+
+def gap_statistic(inertia, n_rows, references, n_clusters, method='kmeans', backend='exact'):
+    """Gap and its standard error for one k.
+
+    Dispersion is taken per row, log(W_k / n), so reference sets smaller
+    than X stay comparable with the fit.
+    """
+    if not references:
+        return float('nan'), float('nan')
+    logs = np.array([np.log(max(cluster_labels(R, n_clusters, method, random_state=i, backend=backend)[2], 1e-12)
+                            / len(R)) for i, R in enumerate(references)])
+    gap = logs.mean() - np.log(max(inertia, 1e-12) / n_rows)
+    return float(gap), float(logs.std() * np.sqrt(1 + 1 / len(logs)))
+
+
+def score_k(X, n_clusters, method='kmeans', tree=None, backend='exact', references=()):
+    """One k-sweep point: the fit plus its silhouette, Calinski-Harabasz and gap scores.
+
+    Returns (labels, centroids, inertia, silhouette, calinski_harabasz,
+    gap, gap_sd); the gap is NaN without `references`.
+    """
+    from sklearn.metrics import silhouette_score, calinski_harabasz_score
+    labels, centroids, inertia = cluster_labels(X, n_clusters, method, tree, backend=backend)
+    gap, gap_sd = gap_statistic(inertia, len(X), references, n_clusters, method, backend)
+    if len(np.unique(labels)) < 2:
+        return labels, centroids, inertia, float('nan'), float('nan'), gap, gap_sd
+    sample_size = SILHOUETTE_SAMPLE if len(X) > SILHOUETTE_SAMPLE else None
+    return (labels, centroids, inertia,
+            float(silhouette_score(X, labels, sample_size=sample_size, random_state=0)),
+            float(calinski_harabasz_score(X, labels)), gap, gap_sd)
+
+
+def gap_choice(ks, gap, gap_sd):
+    """Smallest k with gap(k) >= gap(k + 1) - sd(k + 1), or None."""
+    for i in range(len(ks) - 1):
+        if gap[i] >= gap[i + 1] - gap_sd[i + 1]:
+            return ks[i]
+    return None
+
+
+def ward_assignment(X, rows, fitted):
+    """Labels for every row of X from a Ward cut `fitted` on X[rows].
+
+    Sampled rows keep their cut label and the others take the label of the
+    nearest sampled row, so a resample that contains every row reproduces
+    the cut exactly.
+    """
+    from sklearn.neighbors import KDTree
+    labels = np.empty(len(X), dtype=fitted.dtype)
+    labels[rows] = fitted
+    unsampled = np.setdiff1d(np.arange(len(X)), rows)
+    if len(unsampled):
+        sampled, first = np.unique(rows, return_index=True)
+        nearest = KDTree(X[sampled]).query(X[unsampled], k=1, return_distance=False)[:, 0]
+        labels[unsampled] = fitted[first][nearest]
+    return labels
+
+
+def stability_chunk(X, reference, n_clusters, method, seeds, resample='bootstrap', backend='exact'):
+    """Refit on resamples and count label agreement and co-assignment.
+
+    Each resample is fitted on a bootstrap sample of the rows (or on all
+    rows with a different seed) and labels are aligned to `reference` by
+    Hungarian matching on the label overlap. K-Means assigns every country
+    to its nearest centroid; Ward keeps the tree cut, as the reference does
+    (see ward_assignment).
+    """
+    from scipy.optimize import linear_sum_assignment
+    n = len(X)
+    agree = np.zeros(n, dtype=np.int32)
+    co_assigned = np.zeros((n, n), dtype=np.int32)
+    for seed in seeds:
+        if resample == 'bootstrap':
+            rows = np.random.default_rng(seed).integers(0, n, n)
+        else:
+            rows = np.arange(n)
+        fitted, centroids, _ = cluster_labels(X[rows], n_clusters, method, random_state=seed, backend=backend)
+        if method == 'ward':
+            labels = ward_assignment(X, rows, fitted)
+        else:
+            labels = ((X[:, None, :] - centroids[None, :, :]) ** 2).sum(axis=2).argmin(axis=1)
+
+        overlap = np.zeros((len(centroids), n_clusters), dtype=np.int32)
+        np.add.at(overlap, (labels, reference), 1)
+        rows_idx, cols_idx = linear_sum_assignment(-overlap)
+        mapping = np.full(len(centroids), -1)
+        mapping[rows_idx] = cols_idx
+        agree += mapping[labels] == reference
+
+        one_hot = np.zeros((n, len(centroids)), dtype=np.int32)
+        one_hot[np.arange(n), labels] = 1
+        co_assigned += one_hot @ one_hot.T
+    return agree, co_assigned
@@ -1,21 +1,62 @@
+import time
+_import_start = time.perf_counter()
 import pandas as pd
-from sklearn.cluster import KMeans
-from sklearn.decomposition import PCA
-import plotly.express as px
-from dash import Dash, dcc, html, Input, Output, dash_table
+from dash import Dash, dcc, html, Input, Output, State, dash_table, Patch, no_update, callback_context
+from dash.exceptions import MissingCallbackContextException
 import dash_bootstrap_components as dbc
 import plotly.graph_objects as go
-import itertools
 import numpy as np
+import hashlib
+import os
+import sys
+import threading
+import uuid
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from collections import OrderedDict
+from functools import lru_cache, wraps
+from flask import Response, g, has_request_context, jsonify, request
+import club_optimizer
+from club_optimizer import club_mean, club_objective, pairwise_total
+from clustering_kernels import cluster_labels, gap_choice, gap_references, score_k, stability_chunk
+# scikit-learn, scipy, joblib and plotly.express are imported where they are
+# used: they dominate import time and most requests never need them.
+
 # -----------------------------
-# Load Data
+# Startup timing
 # -----------------------------
-#csv_file = "cluster_data.csv"  # <-- replace with your actual CSV
-cluster = pd.read_csv(r"https://github.com/gohu00/Green_swan/blob/e136e9dcd7d1e453807e846fda408b451fce0c70/cluster.csv?raw=true")
+startup_timings = OrderedDict()
+_last_mark = _import_start
+
+
+def mark_startup(phase):
+    """Record the time since the previous mark under `phase`."""
+    global _last_mark
+    now = time.perf_counter()
+    startup_timings[phase] = now - _last_mark
+    _last_mark = now
+
 
-bubble = pd.read_csv(r"https://github.com/gohu00/Green_swan/blob/main/bubble_filling.csv?raw=true")
-cluster = cluster.merge(bubble, on="ISO", how="left")
-ipd_data = pd.read_csv(r"https://github.com/gohu00/Green_swan/blob/6d35fef595813e2e7d356e74c1f4475318673d40/IdealpointsJuly2025.csv?raw=true")
+def startup_report():
+    lines = ["Startup time breakdown:"]
+    lines += [f"  {phase:<24} {seconds * 1000:8.1f} ms" for phase, seconds in startup_timings.items()]
+    lines.append(f"  {'total':<24} {sum(startup_timings.values()) * 1000:8.1f} ms")
+    return "\n".join(lines)
+
+
+mark_startup('imports')
+# -----------------------------
+# Data files
+# -----------------------------
+# The CSVs ship with the repo (override with GREEN_SWAN_DATA_DIR); a
+# prebuilt snapshot of the merged frame is cached next to them (override
+# with GREEN_SWAN_SNAPSHOT_DIR) so workers never hit the network at boot.
+DATA_DIR = os.environ.get("GREEN_SWAN_DATA_DIR", os.path.dirname(os.path.abspath(__file__)))
+SNAPSHOT_DIR = os.environ.get("GREEN_SWAN_SNAPSHOT_DIR", os.path.join(DATA_DIR, ".snapshot"))
+CLUSTER_CSV = os.path.join(DATA_DIR, "cluster.csv")
+BUBBLE_CSV = os.path.join(DATA_DIR, "bubble_filling.csv")
+IPD_CSV = os.path.join(DATA_DIR, "IdealpointsJuly2025.csv")
 # -----------------------------
 # Dimensions and variable groups
 # -----------------------------
@@ -88,7 +129,13 @@ cluster_names = {
     2: "Group 3",
     3: "Group 4",
     4: "Group 5",
-    5: "Group 6"
+    5: "Group 6",
+    6: "Group 7",
+    7: "Group 8",
+    8: "Group 9",
+    9: "Group 10",
+    10: "Group 11",
+    11: "Group 12"
 }
 
 color_map = {
@@ -97,7 +144,20 @@ color_map = {
     "Group 3": "#2ca02c",
     "Group 4": "#ff7f0e",
     "Group 5": "#9467bd",
-    "Group 6": "#8c564b"
+    "Group 6": "#8c564b",
+    "Group 7": "#e377c2",
+    "Group 8": "#7f7f7f",
+    "Group 9": "#bcbd22",
+    "Group 10": "#17becf",
+    "Group 11": "#aec7e8",
+    "Group 12": "#ff9896"
+}
+
+# Largest k offered by the slider for each clustering engine; cutting a
+# cached Ward tree is cheap, so hierarchical mode allows more groups
+cluster_k_max = {
+    'kmeans': 6,
+    'ward': 12
 }
 
 # Example lists (adjust as needed)
@@ -448,30 +508,288 @@ cis_iso_alpha3 = [
     "TJK",  # Tajikistan
     "UZB"   # Uzbekistan
 ]
-# Create separate boolean columns for each group
-cluster['is_OECD'] = cluster['ISO'].isin(OECD_members)
-cluster['is_BRICS'] = cluster['ISO'].isin(BRICS_members)
-cluster['is_BRICS_plus'] = cluster['ISO'].isin(BRICS_plus_members)
-cluster['is_G7'] = cluster['ISO'].isin(g7_iso3)
-cluster['is_Coalition'] = cluster['ISO'].isin(coalition_iso_alpha3)
-cluster['is_COP30'] = cluster['ISO'].isin(cop_30_mofs)
-cluster['is_NGFS'] = cluster['ISO'].isin(ngfs_iso_alpha3)
-cluster['is_BOGA'] = cluster['ISO'].isin(boga_iso_alpha3)
-cluster['is_PPCA'] = cluster['ISO'].isin(ppca_iso_alpha3)
-cluster['is_FF_NPT'] = cluster['ISO'].isin(ff_npt_iso_alpha3)
-cluster['is_Port_Vila'] = cluster['ISO'].isin(port_vila_call_iso_alpha3)
-cluster['is_CNC'] = cluster['ISO'].isin(cnc_iso_alpha3)
-cluster['is_COFFS'] = cluster['ISO'].isin(coffis_iso_alpha3)
-cluster['is_GCPA'] = cluster['ISO'].isin(gcpa_finance_mission_iso_alpha3)
-cluster['is_SIDS'] = cluster['ISO'].isin(sids_energy_transition_iso_alpha3)
-cluster['is_V20'] = cluster['ISO'].isin(v20_iso_alpha3)
-cluster['is_EU'] = cluster['ISO'].isin(eu_iso_alpha3)
-cluster['is_AU'] = cluster['ISO'].isin(african_union_iso_alpha3)
-cluster['is_CELAC'] = cluster['ISO'].isin(celac_iso_alpha3)
-cluster['is_ASEAN'] = cluster['ISO'].isin(asean_iso_alpha3)
-cluster['is_SCO'] = cluster['ISO'].isin(sco_iso_alpha3)
-cluster['is_CIS'] = cluster['ISO'].isin(cis_iso_alpha3)
-cluster['is_Commonwealth'] = cluster['ISO'].isin(commonwealth_iso_alpha3)
+# Club key (as used by the group filters) -> ISO list
+club_membership = {
+    'OECD': OECD_members,
+    'BRICS': BRICS_members,
+    'BRICS+': BRICS_plus_members,
+    'G7': g7_iso3,
+    'Coalition': coalition_iso_alpha3,
+    'COP30': cop_30_mofs,
+    'NGFS': ngfs_iso_alpha3,
+    'BOGA': boga_iso_alpha3,
+    'PPCA': ppca_iso_alpha3,
+    'FF_NPT': ff_npt_iso_alpha3,
+    'Port_Vila': port_vila_call_iso_alpha3,
+    'CNC': cnc_iso_alpha3,
+    'COFFS': coffis_iso_alpha3,
+    'GCPA': gcpa_finance_mission_iso_alpha3,
+    'SIDS': sids_energy_transition_iso_alpha3,
+    'V20': v20_iso_alpha3,
+    'EU': eu_iso_alpha3,
+    'AU': african_union_iso_alpha3,
+    'CELAC': celac_iso_alpha3,
+    'ASEAN': asean_iso_alpha3,
+    'SCO': sco_iso_alpha3,
+    'CIS': cis_iso_alpha3,
+    'Commonwealth': commonwealth_iso_alpha3
+}
+
+
+# -----------------------------
+# Load Data
+# -----------------------------
+SNAPSHOT_VERSION = 2
+
+
+def data_hash(paths=(CLUSTER_CSV, BUBBLE_CSV, IPD_CSV)):
+    """Content hash of the source files a snapshot is built from."""
+    h = hashlib.sha256(f"v{SNAPSHOT_VERSION}".encode())
+    for path in paths:
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                h.update(block)
+    return h.hexdigest()[:16]
+
+
+def write_snapshot(obj, path):
+    """Pickle `obj` to `path` atomically; a read-only deploy just skips it."""
+    try:
+        os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        pd.to_pickle(obj, tmp)
+        os.replace(tmp, path)
+    except OSError:
+        pass
+
+
+def build_snapshot():
+    """Read the CSVs and merge the indicator and bubble data."""
+    cluster = pd.read_csv(CLUSTER_CSV)
+    bubble = pd.read_csv(BUBBLE_CSV)
+    cluster = cluster.merge(bubble, on="ISO", how="left")
+    ipd_data = pd.read_csv(IPD_CSV)
+    return {'cluster': cluster, 'ipd_data': ipd_data}
+
+
+def load_data():
+    """Return the merged data, from the snapshot cache when it is up to date."""
+    digest = data_hash()
+    path = os.path.join(SNAPSHOT_DIR, f"data-{digest}.pkl")
+    if os.path.exists(path):
+        return pd.read_pickle(path), digest
+    data = build_snapshot()
+    write_snapshot(data, path)
+    return data, digest
+
+
+_data, DATA_HASH = load_data()
+cluster = _data['cluster']
+ipd_data = _data['ipd_data']
+mark_startup('load data')
+
+
+# -----------------------------
+# Feature matrix
+# -----------------------------
+# Preprocessing of the clustering inputs: per-column imputation of missing
+# values ('median', 'mean' or 'zero') followed by scaling ('standard',
+# 'robust' (median/IQR), 'minmax' or 'none')
+FEATURE_IMPUTE = os.environ.get("GREEN_SWAN_IMPUTE", "median")
+FEATURE_SCALING = os.environ.get("GREEN_SWAN_SCALING", "standard")
+# Part of every cached matrix's file name: bump it when numeric_columns or
+# standardize change what gets written
+FEATURE_VERSION = 1
+
+
+def standardize(values, impute='median', scaling='standard'):
+    """Impute missing values and scale each column; returns float32."""
+    X = np.array(values, dtype=np.float64)
+    missing = np.isnan(X)
+    X[:, missing.all(axis=0)] = 0.0
+    if impute == 'zero':
+        fill = np.zeros(X.shape[1])
+    else:
+        fill = (np.nanmedian if impute == 'median' else np.nanmean)(X, axis=0)
+    X[missing] = np.take(fill, np.nonzero(missing)[1])
+
+    if scaling == 'standard':
+        center, scale = X.mean(axis=0), X.std(axis=0)
+    elif scaling == 'robust':
+        q1, center, q3 = np.percentile(X, [25, 50, 75], axis=0)
+        scale = q3 - q1
+    elif scaling == 'minmax':
+        center, scale = X.min(axis=0), np.ptp(X, axis=0)
+    else:
+        center, scale = np.zeros(X.shape[1]), np.ones(X.shape[1])
+    scale[scale == 0] = 1.0  # constant columns stay constant
+    return ((X - center) / scale).astype(np.float32)
+
+
+def numeric_columns(df):
+    return [c for c in df.select_dtypes('number').columns if not c.startswith('Unnamed')]
+
+
+class FeatureMatrix:
+    """Numeric indicator columns as one read-only float32 block.
+
+    The block is column-major, so a column is a contiguous slice, and is
+    memory-mapped from SNAPSHOT_DIR: every worker maps the same file, so
+    the page cache holds one copy however many workers run. Columns are
+    looked up by position through `index` instead of selecting DataFrame
+    columns.
+    """
+
+    def __init__(self, values, columns):
+        self.values = values
+        self.columns = tuple(columns)
+        self.index = {name: i for i, name in enumerate(self.columns)}
+
+    @classmethod
+    def cached(cls, name, columns, n_rows, build):
+        """Map SNAPSHOT_DIR/`name`-<layout>.f32, writing it from `build()` on first use.
+
+        <layout> hashes FEATURE_VERSION, the row count and the column names,
+        so other columns or preprocessing get their own file instead of a
+        wrong-shape mapping of an old one; a file of the wrong size is
+        rewritten.
+        """
+        columns = tuple(columns)
+        layout = hashlib.sha256(repr((FEATURE_VERSION, n_rows, columns)).encode()).hexdigest()[:12]
+        path = os.path.join(SNAPSHOT_DIR, f"{name}-{layout}.f32")
+        n_bytes = n_rows * len(columns) * np.dtype(np.float32).itemsize
+        if not os.path.exists(path) or os.path.getsize(path) != n_bytes:
+            values = np.asfortranarray(build(), dtype=np.float32)
+            try:
+                os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+                tmp = f"{path}.{os.getpid()}.tmp"
+                values.T.tofile(tmp)
+                os.replace(tmp, path)
+            except OSError:
+                values.setflags(write=False)  # read-only deploy: keep it in memory
+                return cls(values, columns)
+        values = np.memmap(path, dtype=np.float32, mode='r', shape=(n_rows, len(columns)), order='F')
+        return cls(values, columns)
+
+    @classmethod
+    def load(cls, df, digest):
+        columns = numeric_columns(df)
+        return cls.cached(f"features-{digest}", columns, len(df),
+                          lambda: df[columns].to_numpy(dtype=np.float32))
+
+    def standardized(self, digest, impute='median', scaling='standard'):
+        """Imputed and scaled copy of the matrix, cached per data hash and settings."""
+        return FeatureMatrix.cached(f"features-{digest}-{impute}-{scaling}", self.columns, len(self),
+                                    lambda: standardize(self.values, impute, scaling))
+
+    def __len__(self):
+        return self.values.shape[0]
+
+    def positions(self, names):
+        return [self.index[name] for name in names]
+
+    def column(self, name):
+        return self.values[:, self.index[name]]
+
+    def take(self, names, fill=None, dtype=np.float32, rows=slice(None)):
+        """(rows x len(names)) array of the named columns, NaN replaced by `fill`."""
+        X = np.array(self.values[rows, self.positions(names)], dtype=dtype)
+        if fill is not None:
+            X[np.isnan(X)] = fill
+        return X
+
+
+feature_matrix = FeatureMatrix.load(cluster, DATA_HASH)
+# Clustering reads only this block: requests gather column positions
+model_matrix = feature_matrix.standardized(DATA_HASH, FEATURE_IMPUTE, FEATURE_SCALING)
+cluster_iso = cluster['ISO'].to_numpy(dtype=object)
+cluster_iso.setflags(write=False)
+mark_startup('feature matrix')
+
+
+# -----------------------------
+# Club registry
+# -----------------------------
+class ClubRegistry:
+    """Club membership as a packed (countries x clubs) bit matrix.
+
+    Each country row holds its clubs as bits in uint64 words, so
+    membership, union and intersection over any set of clubs are a
+    single vectorized AND/compare over the rows.
+    """
+
+    def __init__(self, clubs, iso_codes=()):
+        self.names = list(clubs)
+        self._club_index = {name: i for i, name in enumerate(self.names)}
+        self.iso = pd.Index(sorted(set(iso_codes).union(*clubs.values())))
+        self._row_index = {iso: i for i, iso in enumerate(self.iso)}
+        self.n_words = max(1, (len(self.names) + 63) // 64)
+
+        # One extra all-zero row that unknown ISO codes map to
+        bits = np.zeros((len(self.iso) + 1, self.n_words), dtype=np.uint64)
+        for i, members in enumerate(clubs.values()):
+            rows = self.iso.get_indexer(members)
+            bits[rows, i // 64] |= np.uint64(1) << np.uint64(i % 64)
+        bits.setflags(write=False)
+        self.bits = bits
+
+    def __contains__(self, name):
+        return name in self._club_index
+
+    def rows(self, iso_codes):
+        """Registry rows for an ISO array; unknown codes map to the empty row."""
+        rows = self.iso.get_indexer(pd.Index(iso_codes))
+        rows[rows < 0] = len(self.iso)
+        return rows
+
+    def club_mask(self, names):
+        mask = np.zeros(self.n_words, dtype=np.uint64)
+        for name in names:
+            i = self._club_index.get(name)
+            if i is not None:
+                mask[i // 64] |= np.uint64(1) << np.uint64(i % 64)
+        return mask
+
+    def _select(self, rows):
+        return self.bits[:-1] if rows is None else self.bits[rows]
+
+    def union(self, names, rows=None):
+        """Rows belonging to at least one of `names`."""
+        return (self._select(rows) & self.club_mask(names)).any(axis=1)
+
+    def intersection(self, names, rows=None):
+        """Rows belonging to every club in `names`."""
+        names = list(names)
+        if not names or any(name not in self for name in names):
+            return np.zeros(len(self.iso) if rows is None else len(rows), dtype=bool)
+        mask = self.club_mask(names)
+        return ((self._select(rows) & mask) == mask).all(axis=1)
+
+    def members(self, name, rows=None):
+        return self.union([name], rows)
+
+    def iso_list(self, name):
+        return self.iso[self.members(name)].tolist()
+
+    def clubs_of(self, iso):
+        row = self._row_index.get(iso)
+        if row is None:
+            return []
+        words = self.bits[row]
+        return [name for i, name in enumerate(self.names)
+                if (int(words[i // 64]) >> (i % 64)) & 1]
+
+    def matrix(self, rows=None):
+        """Unpacked boolean (rows x clubs) membership matrix."""
+        as_bytes = np.ascontiguousarray(self._select(rows), dtype='<u8').view(np.uint8)
+        return np.unpackbits(as_bytes, axis=1, bitorder='little')[:, :len(self.names)].astype(bool)
+
+
+club_registry = ClubRegistry(club_membership, iso_codes=pd.concat([cluster['ISO'], ipd_data['ISO']]).dropna())
+# Registry rows of the data frames, resolved once
+cluster_rows = club_registry.rows(cluster['ISO'])
+ipd_rows = club_registry.rows(ipd_data['ISO'])
+mark_startup('club registry')
 
 
 group_filter_options = [
@@ -506,70 +824,307 @@ group_filter_options = [
 # -------------------------
 # Function to compute avg distance
 # -------------------------
-def average_distance(df, iso_list):
+def mean_pairwise_distance(values):
+    """Mean of |a - b| over all pairs of `values`, in O(n log n).
+
+    After sorting, element j is larger than the j elements before it, so
+    the sum of pairwise differences is sum_j x_j * (2j - n + 1).
+    """
+    n = len(values)
+    if n < 2:
+        return None
+    return pairwise_total(values) / (n * (n - 1) / 2)
+
+
+def club_average_distances(values, membership):
+    """Mean pairwise distance for many clubs in one pass.
+
+    `membership` is a (countries x clubs) boolean matrix aligned with
+    `values`. Values are sorted once; each member's rank within its club
+    is a running count down the sorted membership columns. Clubs with
+    fewer than two members get NaN.
+    """
+    values = np.asarray(values, dtype=float)
+    order = np.argsort(values, kind='stable')
+    x = values[order]
+    members = np.asarray(membership, dtype=bool)[order]
+    counts = members.sum(axis=0)
+    ranks = np.cumsum(members, axis=0) - 1
+    weights = np.where(members, 2 * ranks - (counts - 1), 0)
+    # A missing value only poisons the clubs it belongs to
+    missing = np.isnan(x)
+    totals = np.where(missing, 0.0, x) @ weights
+    n_pairs = counts * (counts - 1) / 2
+    with np.errstate(invalid='ignore', divide='ignore'):
+        result = np.where(counts >= 2, totals / n_pairs, np.nan)
+    result[(members & missing[:, None]).any(axis=0)] = np.nan
+    return result
+
+
+def club_pair_distances(values, membership):
+    """Mean distance between the members of every pair of clubs, in one pass.
+
+    For clubs A and B this is the mean |x_i - x_j| over i in A, j in B,
+    i != j; the diagonal is each club's mean pairwise distance. Values are
+    sorted once and prefix sums give, for every country and club A, the
+    summed distance to all members of A:
+
+        d[j, A] = x_j * (2 * below_A(j) - n_A) - 2 * below_sum_A(j) + sum_A
+
+    so the (clubs x clubs) totals are one matrix product M^T d. Cost is
+    O(n * clubs^2) with no Python loop over clubs. Returns the mean and the
+    pair-count matrices; clubs containing a missing value get NaN.
+    """
+    values = np.asarray(values, dtype=float)
+    order = np.argsort(values, kind='stable')
+    x = values[order]
+    members = np.asarray(membership, dtype=bool)[order]
+    missing = np.isnan(x)
+    x = np.where(missing, 0.0, x)
+
+    m = members.astype(float)
+    counts = m.sum(axis=0)
+    below = np.cumsum(m, axis=0) - m
+    below_sum = np.cumsum(m * x[:, None], axis=0) - m * x[:, None]
+    d = x[:, None] * (2 * below - counts) - 2 * below_sum + (m * x[:, None]).sum(axis=0)
+    totals = m.T @ d
+    pairs = np.outer(counts, counts) - m.T @ m
+    with np.errstate(invalid='ignore', divide='ignore'):
+        means = np.where(pairs > 0, totals / pairs, np.nan)
+    poisoned = (members & missing[:, None]).any(axis=0)
+    means[poisoned, :] = np.nan
+    means[:, poisoned] = np.nan
+    return means, pairs
+
+
+def average_distance(df, iso_list, source=None):
+    """Mean pairwise distance of a club: 1-D ideal points, or a named dyadic matrix."""
+    if source not in (None, IDEAL_POINTS):
+        matrix = distance_matrix(source)
+        return matrix.mean_distance(matrix.rows(iso_list))
     subset = df[df['ISO'].isin(iso_list)]
-    values = subset['geopolitical_distance'].values
-    pairs = list(itertools.combinations(values, 2))
-    distances = [abs(a - b) for a, b in pairs]
-    return sum(distances) / len(distances) if distances else None
+    return mean_pairwise_distance(subset['geopolitical_distance'].values)
+
+
+class ClubDistanceTracker:
+    """Mean pairwise distance of a club maintained under add/remove.
+
+    Two Fenwick trees over the rank of every ideal point hold the count
+    and sum of the current members, so adding or removing a country
+    updates the pairwise total in O(log n):
+    sum |x - y| = x * below - sum_below + sum_above - x * above.
+    """
+
+    def __init__(self, iso_codes, values):
+        values = np.asarray(values, dtype=float)
+        order = np.argsort(values, kind='stable')
+        self._rank = {iso_codes[i]: r + 1 for r, i in enumerate(order)}
+        self._value = {iso_codes[i]: float(values[i]) for i in order}
+        self._n = len(order)
+        self._count = [0] * (self._n + 1)
+        self._sum = [0.0] * (self._n + 1)
+        self.members = set()
+        self.total = 0.0
+        self.value_sum = 0.0
+        self.lock = threading.Lock()
+
+    def _prefix(self, i):
+        count, total = 0, 0.0
+        while i > 0:
+            count += self._count[i]
+            total += self._sum[i]
+            i -= i & -i
+        return count, total
+
+    def _update(self, i, count, value):
+        while i <= self._n:
+            self._count[i] += count
+            self._sum[i] += value
+            i += i & -i
+
+    def _distance_to_members(self, iso):
+        rank, x = self._rank[iso], self._value[iso]
+        below, sum_below = self._prefix(rank - 1)
+        above = len(self.members) - below
+        sum_above = self.value_sum - sum_below
+        return x * below - sum_below + sum_above - x * above
+
+    def add(self, iso):
+        if iso in self.members or iso not in self._rank:
+            return False
+        self.total += self._distance_to_members(iso)
+        self._update(self._rank[iso], 1, self._value[iso])
+        self.members.add(iso)
+        self.value_sum += self._value[iso]
+        return True
+
+    def remove(self, iso):
+        if iso not in self.members:
+            return False
+        self._update(self._rank[iso], -1, -self._value[iso])
+        self.members.discard(iso)
+        self.value_sum -= self._value[iso]
+        self.total -= self._distance_to_members(iso)
+        return True
+
+    def mean(self):
+        m = len(self.members)
+        return self.total / (m * (m - 1) / 2) if m >= 2 else None
+
+
+# -------------------------
+# Dyadic distance matrices
+# -------------------------
+# Optional country x country distances (e.g. from UN votes), one matrix per
+# name or year: DISTANCE_DIR/<name>.f32 holds a row-major float32 N x N
+# block and <name>.iso its N ISO codes, one per line. Matrices are
+# memory-mapped, so switching between them only pages in the rows a query
+# touches. IDEAL_POINTS selects the 1-D ideal points instead.
+DISTANCE_DIR = os.environ.get("GREEN_SWAN_DISTANCE_DIR", os.path.join(DATA_DIR, "distances"))
+IDEAL_POINTS = 'ideal'
+
+
+class DistanceMatrix:
+    """Memory-mapped (countries x countries) float32 distances with an ISO index.
+
+    Missing dyads are NaN and are left out of every mean.
+    """
+
+    def __init__(self, iso, values):
+        self.iso = pd.Index(iso)
+        self.values = values
+        self.registry_rows = club_registry.rows(self.iso)
+
+    @classmethod
+    def load(cls, name, attempts=3):
+        """Map <name>.f32 against the N codes in <name>.iso.
+
+        write() removes the .iso before replacing the .f32 and restores it
+        last, so an .iso that is unchanged across the read indexes the
+        mapped block; a read that races a write is retried.
+        """
+        path = os.path.join(DISTANCE_DIR, name)
+        for attempt in range(attempts):
+            try:
+                before = os.stat(f"{path}.iso")
+                with open(f"{path}.iso") as f:
+                    iso = [line.strip() for line in f if line.strip()]
+                with open(f"{path}.f32", 'rb') as f:
+                    size = os.fstat(f.fileno()).st_size
+                    values = None
+                    if size == len(iso) * len(iso) * 4:
+                        values = np.memmap(f, dtype=np.float32, mode='r', shape=(len(iso), len(iso)))
+                after = os.stat(f"{path}.iso")
+            except FileNotFoundError:
+                if attempt == attempts - 1:
+                    raise
+            else:
+                if (before.st_ino, before.st_mtime_ns) == (after.st_ino, after.st_mtime_ns):
+                    if values is None:
+                        raise ValueError(f"{path}.f32 has {size} bytes, expected {len(iso)}^2 float32 "
+                                         f"for the {len(iso)} ISO codes in {path}.iso")
+                    return cls(iso, values)
+            time.sleep(0.05)
+        raise ValueError(f"distance matrix {name} changed on every read")
+
+    @staticmethod
+    def write(name, iso, matrix):
+        """Store a square distance matrix and its ISO index under DISTANCE_DIR.
+
+        The old .iso is removed first and the new one written last, so
+        readers never pair an index with a block of another write.
+        """
+        matrix = np.asarray(matrix, dtype=np.float32)
+        if matrix.shape != (len(iso), len(iso)):
+            raise ValueError(f"matrix shape {matrix.shape} does not match {len(iso)} ISO codes")
+        os.makedirs(DISTANCE_DIR, exist_ok=True)
+        path = os.path.join(DISTANCE_DIR, name)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        matrix.tofile(tmp)
+        if os.path.exists(f"{path}.iso"):
+            os.remove(f"{path}.iso")
+        os.replace(tmp, f"{path}.f32")
+        with open(tmp, 'w') as f:
+            f.write('\n'.join(iso) + '\n')
+        os.replace(tmp, f"{path}.iso")
+
+    def rows(self, iso_list):
+        """Sorted matrix rows of the known, distinct ISO codes in `iso_list`."""
+        rows = self.iso.get_indexer(pd.Index(list(iso_list)).drop_duplicates())
+        return np.sort(rows[rows >= 0])
+
+    def mean_distance(self, rows):
+        """Mean off-diagonal distance within `rows`, from one fancy-indexed block."""
+        if len(rows) < 2:
+            return None
+        block = np.asarray(self.values[np.ix_(rows, rows)], dtype=np.float64)
+        np.fill_diagonal(block, np.nan)
+        known = ~np.isnan(block)
+        return float(block[known].mean()) if known.any() else None
+
+    def club_means(self, membership):
+        """Mean distance between the members of every pair of clubs (diagonal: within).
+
+        `membership` is a (matrix rows x clubs) boolean matrix. Only the
+        block of rows that belong to some club is read; totals and pair
+        counts are then two matrix products, M^T D M and M^T K M with K
+        marking the known off-diagonal dyads.
+        """
+        used = np.flatnonzero(np.asarray(membership, dtype=bool).any(axis=1))
+        m = np.asarray(membership, dtype=float)[used]
+        block = np.asarray(self.values[np.ix_(used, used)], dtype=np.float64)
+        np.fill_diagonal(block, np.nan)
+        known = ~np.isnan(block)
+        totals = m.T @ np.where(known, block, 0.0) @ m
+        pairs = m.T @ known.astype(float) @ m
+        with np.errstate(invalid='ignore', divide='ignore'):
+            means = np.where(pairs > 0, totals / pairs, np.nan)
+        return means, pairs
+
+
+def distance_sources():
+    """IDEAL_POINTS plus the names of the stored dyadic matrices."""
+    names = []
+    if os.path.isdir(DISTANCE_DIR):
+        names = sorted(name[:-4] for name in os.listdir(DISTANCE_DIR)
+                       if name.endswith('.f32') and os.path.exists(os.path.join(DISTANCE_DIR, name[:-4] + '.iso')))
+    return [IDEAL_POINTS] + names
+
+
+@lru_cache(maxsize=8)
+def distance_matrix(name):
+    return DistanceMatrix.load(name)
+
+
+def distance_label(source):
+    return "1-D ideal points" if source in (None, IDEAL_POINTS) else f"dyadic matrix {source}"
+
+
+def distance_options():
+    return [{'label': distance_label(source), 'value': source} for source in distance_sources()]
 
 
 # -------------------------
 # Make dataset for club summary
 # -------------------------
 
+# Club key -> name used in the club summary and metadata
 club_name_map = {
-    'is_OECD': 'OECD',
-    'is_BRICS': 'BRICS',
-    'is_BRICS_plus': 'BRICS_Plus',
-    'is_G7': 'G7',
-    'is_Coalition': 'Coalition',
-    'is_COP30': 'COP30',
-    'is_NGFS': 'NGFS',
-    'is_BOGA': 'BOGA',
-    'is_PPCA': 'PPCA',
-    'is_FF_NPT': 'FF_NPT',
-    'is_Port_Vila': 'Port_Vila',
-    'is_CNC': 'CNC',
-    'is_COFFS': 'COFFS',
-    'is_GCPA': 'GCPA',
-    'is_SIDS': 'SIDS',
-    'is_V20': 'V20',
-    'is_EU': 'EU',
-    'is_AU': 'AU',
-    'is_CELAC': 'CELAC',
-    'is_ASEAN': 'ASEAN',
-    'is_SCO': 'SCO',
-    'is_CIS': 'CIS',
-    'is_Commonwealth': 'Commonwealth',
-    'is_4P': '4P',
-    'is_Basel': 'Basel',
-    'is_Paris_Club': 'Paris_Club'
+    'BRICS+': 'BRICS_Plus'
 }
 
 
-# List of club columns
-club_columns = [col for col in cluster.columns if col.startswith('is_')]
-
-# Prepare the output list
-summary = []
-
-# Loop through each club column
-for club in club_columns:
-    club_name = club_name_map.get(club, club.replace('is_', ''))
-    members = cluster[cluster[club] == True]
-    iso_list = members['ISO'].dropna().tolist()  # Assuming 'ISO' is equivalent to 'iso3c'
-    num_members = len(iso_list)
-    avg_pairwise_distance = average_distance(cluster, iso_list)
-    
-    summary.append({
-        'Club Name': club_name,
-        'Number of Members': num_members,
-        'Average Pairwise Geopolitical Distance': avg_pairwise_distance
-    })
+# Score every club in one vectorized pass
+membership = club_registry.matrix(cluster_rows)
+has_iso = cluster['ISO'].notna().to_numpy()
+avg_distances = club_average_distances(cluster['geopolitical_distance'].to_numpy(), membership)
 
 # Create the final dataframe
-club_summary_df = pd.DataFrame(summary)
+club_summary_df = pd.DataFrame({
+    'Club Name': [club_name_map.get(club, club) for club in club_registry.names],
+    'Number of Members': (membership & has_iso[:, None]).sum(axis=0),
+    'Average Pairwise Geopolitical Distance': avg_distances
+})
 
 # Create the metadata as a dictionary
 club_metadata = {
@@ -601,6 +1156,7 @@ club_summary_df = club_summary_df.merge(metadata_df, left_on='Club Name', right_
 
 # Drop redundant 'Club' column if desired
 club_summary_df.drop(columns='Club', inplace=True)
+mark_startup('club summary')
 
 
 # -------------------------
@@ -608,344 +1164,1481 @@ club_summary_df.drop(columns='Club', inplace=True)
 # -------------------------
 
 def get_iso_list(club_name):
-    # Map group values to variable names
-    group_map = {
-        "OECD": "OECD_members",
-        "BRICS": "BRICS_members",
-        "BRICS+": "BRICS_plus_members",
-        "G7": "g7_iso3",
-        "Coalition": "coalition_iso_alpha3",
-        "COP30": "cop_30_mofs",
-        "NGFS": "ngfs_iso_alpha3",
-        "BOGA": "boga_iso_alpha3",
-        "PPCA": "ppca_iso_alpha3",
-        "FF_NPT": "ff_npt_iso_alpha3",
-        "Port_Vila": "port_vila_call_iso_alpha3",
-        "CNC": "cnc_iso_alpha3",
-        "COFFS": "coffis_iso_alpha3",
-        "GCPA": "gcpa_finance_mission_iso_alpha3",
-        "SIDS": "sids_energy_transition_iso_alpha3",
-        "V20": "v20_iso_alpha3",
-        "EU": "eu_iso_alpha3",
-        "AU": "african_union_iso_alpha3",
-        "CELAC": "celac_iso_alpha3",
-        "ASEAN": "asean_iso_alpha3",
-        "Commonwealth": "commonwealth_iso_alpha3",
-        "SCO": "sco_iso_alpha3",
-        "CIS": "cis_iso_alpha3"
-    }
-    return globals().get(group_map.get(club_name, ""), [])
+    return club_registry.iso_list(club_name)
 
 
 # -----------------------------
-# App Initialization
+# Club optimizer
 # -----------------------------
-app = Dash(__name__, external_stylesheets=[dbc.themes.BOOTSTRAP], suppress_callback_exceptions=True)
-server = app.server
+OPTIMIZER_TIME_BUDGET = float(os.environ.get("GREEN_SWAN_OPTIMIZER_BUDGET", 2.0))
+# Web worker processes on this host: gunicorn's own default, which
+# gunicorn.conf.py overrides by exporting WEB_CONCURRENCY before the app loads
+WEB_WORKERS = max(1, int(os.environ.get("WEB_CONCURRENCY", 1)))
+# Every web worker owns a pool, so by default the pools together use about
+# one process per CPU, at most 4 per web worker
+OPTIMIZER_WORKERS = int(os.environ.get(
+    "GREEN_SWAN_OPTIMIZER_WORKERS", max(1, min(4, (os.cpu_count() or 1) // WEB_WORKERS))))
+
+# Country ambition: mean Climate Ambition of the clubs it belongs to (0 if none)
+club_ambition = metadata_df.set_index('Club')['Climate Ambition']
+club_ambition = np.array([club_ambition.get(club_name_map.get(club, club), 0) for club in club_registry.names], dtype=float)
+ipd_membership = club_registry.matrix(ipd_rows)
+with np.errstate(invalid='ignore', divide='ignore'):
+    country_ambition = np.nan_to_num((ipd_membership @ club_ambition) / ipd_membership.sum(axis=1))
+
+
+_optimizer_pool = None
+_optimizer_pool_lock = threading.Lock()
+
+
+def optimizer_pool():
+    global _optimizer_pool
+    with _optimizer_pool_lock:
+        if _optimizer_pool is None:
+            _optimizer_pool = ProcessPoolExecutor(
+                max_workers=OPTIMIZER_WORKERS, mp_context=multiprocessing.get_context('spawn'))
+        return _optimizer_pool
+
+
+def warm_optimizer_pool():
+    """Start the pool's processes now so the first optimizer call does not wait on them.
+
+    Call it in each serving process (see gunicorn.conf.py), not before fork.
+    """
+    if OPTIMIZER_WORKERS > 0:
+        pool = optimizer_pool()
+        wait([pool.submit(club_optimizer.warm) for _ in range(OPTIMIZER_WORKERS)])
+
+
+def reset_optimizer_pool():
+    global _optimizer_pool
+    with _optimizer_pool_lock:
+        if _optimizer_pool is not None:
+            _optimizer_pool.shutdown(wait=False, cancel_futures=True)
+        _optimizer_pool = None
+
+
+def optimize_club(seed_iso, max_distance, required_iso=(), excluded_iso=(), objective='size',
+                  time_budget=OPTIMIZER_TIME_BUDGET, workers=OPTIMIZER_WORKERS):
+    """Largest (or most ambitious) club whose mean pairwise distance fits `max_distance`.
+
+    Independent restarts of the local search run in a process pool until
+    the time budget; the best club found by then is returned, falling
+    back to the in-process greedy solution if no worker reports in time.
+    """
+    iso = ipd_data['ISO'].to_numpy()
+    values = ipd_data['geopolitical_distance'].to_numpy(dtype=float)
+    allowed = ~np.isnan(values) & ~np.isin(iso, list(excluded_iso))
+    required = np.isin(iso, list(required_iso)) & allowed
+    seed = np.isin(iso, list(seed_iso)) & allowed
+
+    required_mean = mean_pairwise_distance(values[required])
+    if required_mean is not None and required_mean > max_distance:
+        return {'members': iso[required].tolist(), 'mean': required_mean, 'feasible': False,
+                'ambition': float(country_ambition[required].sum()), 'iterations': 0}
+
+    args = (values, country_ambition, seed, required, allowed, max_distance, objective)
+    # Deterministic greedy in-process: the best-so-far if the pool is slow
+    deadline = time.time() + time_budget
+    best_rows, best_total, iterations = club_optimizer.local_search(*args, 0.0, 0)
+    best_key = club_objective(np.isin(np.arange(len(iso)), best_rows), club_mean(best_total, len(best_rows)),
+                              country_ambition, objective)
+
+    if workers > 0 and time_budget > 0:
+        try:
+            futures = [optimizer_pool().submit(club_optimizer.local_search, *args, deadline, rng_seed)
+                       for rng_seed in range(1, workers + 1)]
+        except BrokenProcessPool:
+            reset_optimizer_pool()
+            futures = []
+        done, _ = wait(futures, timeout=max(0.0, deadline - time.time()) + 0.5)
+        for future in done:
+            if future.exception() is not None:
+                continue
+            rows, total, n = future.result()
+            iterations += n
+            key = club_objective(np.isin(np.arange(len(iso)), rows), club_mean(total, len(rows)),
+                                 country_ambition, objective)
+            if key > best_key:
+                best_rows, best_total, best_key = rows, total, key
+
+    return {'members': iso[best_rows].tolist(), 'mean': club_mean(best_total, len(best_rows)),
+            'feasible': True, 'ambition': float(country_ambition[best_rows].sum()), 'iterations': iterations}
+
 
 # -----------------------------
-# Layout
+# Clustering engine
 # -----------------------------
+class LRUCache:
+    """Thread-safe, size-bounded LRU mapping with hit/miss counters."""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._data.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+        return value
+
+    def peek(self, key):
+        """Value for `key` without touching the LRU order or the counters."""
+        with self._lock:
+            return self._data.get(key)
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses,
+                    'size': len(self._data), 'maxsize': self.maxsize}
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+def _read_only(result):
+    # Cached results are shared between requests: keep them read-only
+    for value in result.values():
+        if isinstance(value, np.ndarray):
+            value.setflags(write=False)
+    return result
+
+
+CLUSTER_METHODS = {
+    'kmeans': 'K-Means',
+    'ward': 'Hierarchical (Ward)'
+}
 
 
+# joblib workers for k-sweeps and stability runs, per web worker: by default
+# the web workers together use about one process per CPU
+SWEEP_WORKERS = int(os.environ.get("GREEN_SWAN_SWEEP_WORKERS", max(1, (os.cpu_count() or 1) // WEB_WORKERS)))
+# Uniform reference sets per k for the gap statistic
+GAP_REFERENCES = int(os.environ.get("GREEN_SWAN_GAP_REFERENCES", 10))
+
+# Above this many rows PCA and K-Means switch to their streaming solvers
+# (IncrementalPCA and MiniBatchKMeans fed row chunks from the feature
+# matrix); silhouette scores are computed on a sample of at most
+# clustering_kernels.SILHOUETTE_SAMPLE rows
+SCALABLE_THRESHOLD = int(os.environ.get("GREEN_SWAN_SCALABLE_THRESHOLD", 20000))
+CHUNK_ROWS = int(os.environ.get("GREEN_SWAN_CHUNK_ROWS", 8192))
+STREAM_EPOCHS = 20
+
+
+def clustering_backend(n_rows, backend=None):
+    """'exact' or 'scalable'; `backend` forces one regardless of size."""
+    if backend is not None:
+        return backend
+    return 'scalable' if n_rows > SCALABLE_THRESHOLD else 'exact'
+
+
+def row_chunks(n_rows, chunk_rows=None):
+    """Contiguous row slices of roughly `chunk_rows` rows covering all rows."""
+    n_chunks = max(1, -(-n_rows // (chunk_rows or CHUNK_ROWS)))
+    bounds = np.linspace(0, n_rows, n_chunks + 1).astype(int)
+    return [slice(start, stop) for start, stop in zip(bounds[:-1], bounds[1:])]
+
+
+def stream_kmeans(chunk, n_rows, n_clusters, random_state=42, max_epochs=STREAM_EPOCHS, tol=1e-4):
+    """MiniBatchKMeans fitted by partial_fit on row chunks read through `chunk(rows)`.
+
+    Chunks are visited in a shuffled order each epoch until no centroid
+    moves by more than `tol`; labels and inertia come from a final pass.
+    Only one chunk of rows is in memory at a time.
+    """
+    from sklearn.cluster import MiniBatchKMeans
+    kmeans = MiniBatchKMeans(n_clusters=n_clusters, batch_size=CHUNK_ROWS, random_state=random_state)
+    batches = row_chunks(n_rows)
+    rng = np.random.default_rng(random_state)
+    previous = None
+    for _ in range(max_epochs):
+        for i in rng.permutation(len(batches)):
+            kmeans.partial_fit(chunk(batches[i]))
+        if previous is not None and np.abs(kmeans.cluster_centers_ - previous).max() < tol:
+            break
+        previous = kmeans.cluster_centers_.copy()
+    labels, inertia = [], 0.0
+    for rows in row_chunks(n_rows):
+        X = chunk(rows)
+        labels.append(kmeans.predict(X))
+        inertia -= kmeans.score(X)
+    return np.concatenate(labels), kmeans.cluster_centers_, float(inertia)
+
+
+class ClusteringEngine:
+    """PCA + clustering results memoized by (sorted features, k, method).
+
+    The per-feature-set work (feature matrix, PCA projection and, for
+    Ward, the linkage tree) is cached separately from the per-k labels,
+    so for hierarchical clustering any k is just a cut of a cached tree.
+    `backend` forces the exact or scalable solvers; by default they are
+    chosen by row count (see clustering_backend). The scalable PCA and
+    K-Means fit stream row chunks and never hold the full matrix; sweeps,
+    stability runs, Ward trees and neighbour indexes still build it.
+    """
+
+    def __init__(self, features, maxsize=256, max_bases=64, backend=None):
+        self.features = features
+        self.backend = clustering_backend(len(features), backend)
+        self.results = LRUCache(maxsize)
+        self.bases = LRUCache(max_bases)
+        self.sweeps = LRUCache(max_bases)
+        self.stabilities = LRUCache(max_bases)
+
+    @staticmethod
+    def key(features, n_clusters, method='kmeans'):
+        return tuple(sorted(set(features))), int(n_clusters), method
+
+    def basis(self, features):
+        """2-D PCA projection for a sorted feature tuple, plus the feature matrix (exact backend)."""
+        basis = self.bases.get(features)
+        if basis is None:
+            from sklearn.decomposition import PCA, IncrementalPCA
+            if self.backend == 'scalable':
+                # Stream row chunks from the shared feature matrix; the full
+                # (rows x features) block is only built if matrix() is called
+                pca = IncrementalPCA(n_components=2)
+                for rows in row_chunks(len(self.features)):
+                    pca.partial_fit(self._chunk(features, rows))
+                components = np.vstack([pca.transform(self._chunk(features, rows))
+                                        for rows in row_chunks(len(self.features))])
+                basis = {}
+            else:
+                pca = PCA(n_components=2)
+                X = self.features.take(features, dtype=float)
+                components = pca.fit_transform(X)
+                basis = {'X': X}
+            basis.update({
+                'PC1': components[:, 0],
+                'PC2': components[:, 1],
+                'explained_variance': pca.explained_variance_ratio_
+            })
+            basis = self.bases.put(features, _read_only(basis))
+        return basis
+
+    def _chunk(self, features, rows):
+        return self.features.take(features, dtype=float, rows=rows)
+
+    def matrix(self, features):
+        """(rows x features) float64 matrix, cached with the basis once built."""
+        features = tuple(sorted(set(features)))
+        basis = self.basis(features)
+        if 'X' not in basis:
+            X = self.features.take(features, dtype=float)
+            X.setflags(write=False)
+            basis['X'] = X
+        return basis['X']
+
+    def tree(self, features):
+        """Ward linkage matrix for a feature set, built once and cached with its basis."""
+        basis = self.basis(tuple(sorted(set(features))))
+        if 'tree' not in basis:
+            from scipy.cluster.hierarchy import linkage
+            tree = linkage(self.matrix(features), method='ward')
+            tree.setflags(write=False)
+            basis['tree'] = tree
+        return basis['tree']
+
+    def neighbors_index(self, features):
+        """KD-tree (BallTree above 16 features) over the feature matrix, cached with its basis."""
+        basis = self.basis(tuple(sorted(set(features))))
+        if 'neighbors' not in basis:
+            from sklearn.neighbors import BallTree, KDTree
+            X = self.matrix(features)
+            basis['neighbors'] = (KDTree if X.shape[1] <= 16 else BallTree)(X)
+        return basis['neighbors']
+
+    def fit(self, features, n_clusters, method='kmeans'):
+        key = self.key(features, n_clusters, method)
+        result = self.results.get(key)
+        if result is None:
+            result = self.results.put(key, self._compute(*key))
+        return result
+
+    def _compute(self, features, n_clusters, method):
+        basis = self.basis(features)
+        if method == 'kmeans' and self.backend == 'scalable':
+            labels, centroids, _ = stream_kmeans(lambda rows: self._chunk(features, rows),
+                                                 len(self.features), n_clusters)
+        else:
+            tree = self.tree(features) if method == 'ward' else None
+            labels, centroids, _ = cluster_labels(self.matrix(features), n_clusters, method, tree,
+                                                  backend=self.backend)
+        return self._result(basis, features, n_clusters, method, labels, centroids)
+
+    @staticmethod
+    def _result(basis, features, n_clusters, method, labels, centroids):
+        return _read_only({
+            'features': features,
+            'k': n_clusters,
+            'method': method,
+            'PC1': basis['PC1'],
+            'PC2': basis['PC2'],
+            'labels': labels,
+            'centroids': centroids,
+            'explained_variance': basis['explained_variance']
+        })
+
+    def sweep(self, features, k_min=2, k_max=12, method='kmeans', n_jobs=None):
+        """Fit every k in [k_min, k_max] in parallel and score each fit.
+
+        Returns inertia, silhouette, Calinski-Harabasz and the gap statistic
+        (with its standard error and the k it selects) per k, cached per
+        feature set. Each fit is also stored as the (features, k) result,
+        so the cluster graph serves any swept k without refitting.
+        """
+        features = tuple(sorted(set(features)))
+        key = (features, int(k_min), int(k_max), method)
+        sweep = self.sweeps.get(key)
+        if sweep is not None:
+            return sweep
+        from joblib import Parallel, delayed
+
+        basis = self.basis(features)
+        X = self.matrix(features)
+        tree = self.tree(features) if method == 'ward' else None
+        ks = list(range(int(k_min), min(int(k_max), len(X) - 1) + 1))
+        references = gap_references(X, GAP_REFERENCES)
+        fits = Parallel(n_jobs=SWEEP_WORKERS if n_jobs is None else n_jobs)(
+            delayed(score_k)(X, k, method, tree, self.backend, references) for k in ks)
+
+        for k, fit in zip(ks, fits):
+            labels, centroids = fit[:2]
+            self.results.put(self.key(features, k, method), self._result(basis, features, k, method, labels, centroids))
+        gap, gap_sd = [fit[5] for fit in fits], [fit[6] for fit in fits]
+        return self.sweeps.put(key, {
+            'features': features,
+            'method': method,
+            'k': ks,
+            'inertia': [fit[2] for fit in fits],
+            'silhouette': [fit[3] for fit in fits],
+            'calinski_harabasz': [fit[4] for fit in fits],
+            'gap': gap,
+            'gap_sd': gap_sd,
+            'gap_k': gap_choice(ks, gap, gap_sd)
+        })
+
+    def stability(self, features, n_clusters, method='kmeans', n_resamples=200, resample='bootstrap', n_jobs=None):
+        """Per-country stability and co-assignment over resampled refits.
+
+        Resamples run in parallel chunks. The co-assignment matrix holds the
+        share of resamples in which two countries share a cluster, stored
+        as uint8 (0-255); stability is the share in which a country keeps
+        its reference cluster.
+        """
+        features = tuple(sorted(set(features)))
+        key = (features, int(n_clusters), method, int(n_resamples), resample)
+        result = self.stabilities.get(key)
+        if result is not None:
+            return result
+        from joblib import Parallel, delayed
+
+        X = self.matrix(features)
+        reference = self.fit(features, n_clusters, method)['labels']
+        n_jobs = SWEEP_WORKERS if n_jobs is None else n_jobs
+        workers = (os.cpu_count() or 1) if n_jobs < 0 else n_jobs
+        chunks = np.array_split(np.arange(1, n_resamples + 1), max(1, min(n_resamples, workers * 4)))
+        parts = Parallel(n_jobs=n_jobs)(
+            delayed(stability_chunk)(X, reference, int(n_clusters), method, seeds, resample, self.backend)
+            for seeds in chunks if len(seeds))
+
+        agree = sum(part[0] for part in parts)
+        co_assigned = sum(part[1] for part in parts)
+        return self.stabilities.put(key, _read_only({
+            'features': features,
+            'k': int(n_clusters),
+            'method': method,
+            'n_resamples': int(n_resamples),
+            'stability': (agree / n_resamples).astype(np.float32),
+            'coassignment': np.rint(co_assigned * (255 / n_resamples)).astype(np.uint8)
+        }))
+
+    def stats(self):
+        return self.results.stats()
+
+    def clear(self):
+        self.results.clear()
+        self.bases.clear()
+        self.sweeps.clear()
+        self.stabilities.clear()
+
+
+# -----------------------------
+# Panel years
+# -----------------------------
+# cluster.csv + bubble_filling.csv are the BASE_YEAR vintage. Other years
+# are optional partitions PANEL_DIR/indicators-<year>.csv (or .parquet,
+# which needs pyarrow or fastparquet), one row per country with the columns of the merged base data. A year is
+# read only when it is first selected; its matrices are then memory-mapped
+# from SNAPSHOT_DIR and at most YEAR_CACHE years keep their engine caches.
+BASE_YEAR = int(os.environ.get("GREEN_SWAN_BASE_YEAR", 2023))
+PANEL_DIR = os.environ.get("GREEN_SWAN_PANEL_DIR", os.path.join(DATA_DIR, "panel"))
+YEAR_CACHE = int(os.environ.get("GREEN_SWAN_YEAR_CACHE", 4))
+
+
+def panel_partitions():
+    """Year -> partition file, preferring csv over parquet."""
+    partitions = {}
+    if os.path.isdir(PANEL_DIR):
+        for name in sorted(os.listdir(PANEL_DIR)):
+            stem, ext = os.path.splitext(name)
+            year = stem[len('indicators-'):]
+            if stem.startswith('indicators-') and year.isdigit() and ext in ('.parquet', '.csv'):
+                if ext == '.csv' or int(year) not in partitions:
+                    partitions[int(year)] = os.path.join(PANEL_DIR, name)
+    return partitions
+
+
+def read_partition(path):
+    if path.endswith('.parquet'):
+        return pd.read_parquet(path)  # needs pyarrow or fastparquet
+    return pd.read_csv(path)
+
+
+def write_panel(df, year_column='year', fmt='csv'):
+    """Split a long (country x year) table into per-year partitions in PANEL_DIR."""
+    os.makedirs(PANEL_DIR, exist_ok=True)
+    for year, part in df.groupby(year_column):
+        part = part.drop(columns=year_column).reset_index(drop=True)
+        path = os.path.join(PANEL_DIR, f"indicators-{int(year)}.{fmt}")
+        if fmt == 'parquet':
+            part.to_parquet(path, index=False)
+        else:
+            part.to_csv(path, index=False)
+
+
+class YearPanel:
+    """One year's clustering inputs: ISO per row, club rows, raw and model matrices and an engine."""
+
+    def __init__(self, year, iso, features, model):
+        self.year = year
+        self.iso = iso
+        self.iso.setflags(write=False)
+        self.rows = club_registry.rows(iso)
+        self.features = features
+        self.model = model
+        self.engine = ClusteringEngine(model)
+
+    @classmethod
+    def load(cls, year, path):
+        digest, meta = partition_meta(path)
+        features = FeatureMatrix.cached(f"features-{digest}", meta['columns'], len(meta['iso']),
+                                        lambda: read_partition(path)[meta['columns']].to_numpy(dtype=np.float32))
+        return cls(year, meta['iso'], features, features.standardized(digest, FEATURE_IMPUTE, FEATURE_SCALING))
+
+
+@lru_cache(maxsize=None)
+def partition_meta(path):
+    """Data hash plus ISO codes and numeric columns of a partition, cached in SNAPSHOT_DIR."""
+    digest = data_hash([path])
+    meta_path = os.path.join(SNAPSHOT_DIR, f"panel-{digest}-v{FEATURE_VERSION}.pkl")
+    if os.path.exists(meta_path):
+        return digest, pd.read_pickle(meta_path)
+    frame = read_partition(path)
+    meta = {'iso': frame['ISO'].to_numpy(dtype=object), 'columns': numeric_columns(frame)}
+    write_snapshot(meta, meta_path)
+    return digest, meta
+
+
+PANEL_FILES = panel_partitions()
+PANEL_YEARS = sorted({BASE_YEAR, *PANEL_FILES})
+base_panel = YearPanel(BASE_YEAR, cluster_iso, feature_matrix, model_matrix)
+year_panels = LRUCache(YEAR_CACHE)
+
+
+def year_panel(year=None):
+    """The panel for `year`, loaded on first use; unknown years fall back to BASE_YEAR."""
+    year = BASE_YEAR if year is None else int(year)
+    if year == BASE_YEAR or year not in PANEL_FILES:
+        return base_panel
+    panel = year_panels.get(year)
+    if panel is None:
+        panel = year_panels.put(year, YearPanel.load(year, PANEL_FILES[year]))
+    return panel
+
+
+def panel_meta(year=None):
+    """ISO codes and feature columns of a year, read without building its panel."""
+    year = BASE_YEAR if year is None else int(year)
+    if year == BASE_YEAR or year not in PANEL_FILES:
+        return {'iso': base_panel.iso, 'columns': base_panel.model.columns}
+    return partition_meta(PANEL_FILES[year])[1]
+
+
+clustering_engine = base_panel.engine
+
+
+# -----------------------------
+# Similar countries
+# -----------------------------
+def similar_countries(features, iso, n_neighbors=10, year=None):
+    """The `n_neighbors` countries closest to `iso` on the standardized features.
+
+    Queries the engine's cached spatial index for the year; the engine is
+    built for this data hash, so a data change means a fresh index. Returns
+    None for an unknown ISO code.
+    """
+    panel = year_panel(year)
+    rows = np.flatnonzero(panel.iso == iso)
+    if len(rows) == 0:
+        return None
+    features = tuple(sorted(set(features)))
+    index = panel.engine.neighbors_index(features)
+    X = panel.engine.matrix(features)
+    # Extra candidates so the country itself and duplicate rows can be skipped
+    k = min(len(X), n_neighbors + len(rows) + 1)
+    distances, neighbors = index.query(X[rows[:1]], k=k)
+    result = []
+    seen = {iso}
+    for distance, row in zip(distances[0].tolist(), neighbors[0].tolist()):
+        other = panel.iso[row]
+        if other in seen:
+            continue
+        seen.add(other)
+        result.append({'ISO': other, 'Country': country_names.get(other, other), 'distance': round(distance, 4)})
+        if len(result) == n_neighbors:
+            break
+    return result
+
+
+# -----------------------------
+# Cluster transitions
+# -----------------------------
+def label_mapping(labels, reference):
+    """Map each label id onto the `reference` id it overlaps most.
+
+    Hungarian matching on the (labels x reference) contingency table;
+    labels left unmatched (more clusters than the reference) take the
+    smallest ids not used by a match.
+    """
+    from scipy.optimize import linear_sum_assignment
+    n_labels, n_ref = int(labels.max()) + 1, int(reference.max()) + 1
+    overlap = np.bincount(labels * n_ref + reference, minlength=n_labels * n_ref).reshape(n_labels, n_ref)
+    rows, cols = linear_sum_assignment(-overlap)
+    mapping = np.full(n_labels, -1)
+    mapping[rows] = cols
+    taken = set(cols.tolist())
+    spare = (i for i in range(n_labels + n_ref) if i not in taken)
+    for i in np.flatnonzero(mapping < 0):
+        mapping[i] = next(spare)
+    return mapping
+
+
+def transition_counts(source, target):
+    """(source x target) label counts over the rows labelled in both stages."""
+    both = (source >= 0) & (target >= 0)
+    n = int(max(source.max(), target.max())) + 1
+    return np.bincount(source[both] * n + target[both], minlength=n * n).reshape(n, n)
+
+
+transitions = LRUCache(64)
+# Labels of every (year, features, k, method) fit a transition view used:
+# small int vectors that outlive the year panels they came from
+transition_labels = LRUCache(1024)
+
+
+def stage_labels(year, features, n_clusters, method):
+    """Cluster labels of one year's fit, without disturbing the year panel cache.
+
+    A cached panel serves the fit; any other year is loaded just for it
+    and not added to `year_panels`, so a view across more years than
+    YEAR_CACHE neither evicts the panels in use nor reloads them.
+    """
+    key = (year, features, n_clusters, method)
+    labels = transition_labels.get(key)
+    if labels is None:
+        if year == BASE_YEAR or year not in PANEL_FILES:
+            panel = base_panel
+        else:
+            panel = year_panels.peek(year) or YearPanel.load(year, PANEL_FILES[year])
+        labels = transition_labels.put(key, panel.engine.fit(features, n_clusters, method)['labels'])
+    return labels
+
+
+def cluster_transitions(features, method, stages, anchor):
+    """Aligned assignments and transition counts for a sequence of (year, k) stages.
+
+    Labels are read through stage_labels. The anchor stage keeps
+    its labels (the palette the scatter shows); the other stages are
+    aligned outward from it, each onto its neighbour. `assignment` holds
+    one column per stage over the union of ISO codes, -1 where a country
+    is absent that year.
+    """
+    features = tuple(sorted(set(features)))
+    stages = tuple((int(year), int(k)) for year, k in stages)
+    key = (features, method, stages, anchor)
+    result = transitions.get(key)
+    if result is not None:
+        return result
+
+    stage_iso = {year: panel_meta(year)['iso'] for year, _ in stages}
+    iso = pd.Index(np.concatenate(list(stage_iso.values()))).drop_duplicates()
+    assignment = np.full((len(iso), len(stages)), -1, dtype=np.int16)
+    for j, (year, k) in enumerate(stages):
+        assignment[iso.get_indexer(stage_iso[year]), j] = stage_labels(year, features, k, method)
+
+    start = stages.index(anchor)
+    for j in list(range(start + 1, len(stages))) + list(range(start - 1, -1, -1)):
+        ref = j - 1 if j > start else j + 1
+        both = (assignment[:, j] >= 0) & (assignment[:, ref] >= 0)
+        mapping = label_mapping(assignment[both, j], assignment[both, ref])
+        present = assignment[:, j] >= 0
+        assignment[present, j] = mapping[assignment[present, j]]
+
+    return transitions.put(key, _read_only({
+        'stages': stages,
+        'iso': iso.to_numpy(dtype=object),
+        'assignment': assignment,
+        'counts': [transition_counts(assignment[:, j], assignment[:, j + 1]) for j in range(len(stages) - 1)]
+    }))
+
+
+def validate_backend(features=None, k_values=range(2, 7)):
+    """Agreement of the scalable solvers with the exact ones on the loaded data.
+
+    Per k: adjusted Rand index of the K-Means labels, the scalable/exact
+    inertia ratio, and |correlation| of the exact and incremental PC1 scores.
+    """
+    from sklearn.metrics import adjusted_rand_score
+    features = tuple(sorted(features or [f for names in dimensions.values() for f in names
+                                         if f in model_matrix.index]))
+    exact = ClusteringEngine(model_matrix, backend='exact')
+    scalable = ClusteringEngine(model_matrix, backend='scalable')
+    pcs = [np.column_stack([engine.basis(features)['PC1'], engine.basis(features)['PC2']])
+           for engine in (exact, scalable)]
+    pc1_corr = abs(np.corrcoef(pcs[0][:, 0], pcs[1][:, 0])[0, 1])
+    rows = []
+    for k in k_values:
+        a, b = exact.fit(features, k), scalable.fit(features, k)
+        X = exact.matrix(features)
+        inertia = [float(((X - r['centroids'][r['labels']]) ** 2).sum()) for r in (a, b)]
+        rows.append({'k': k, 'ari': float(adjusted_rand_score(a['labels'], b['labels'])),
+                     'inertia_ratio': inertia[1] / inertia[0], 'pc1_corr': float(pc1_corr)})
+    return rows
+
+
+# -----------------------------
+# Club creator state
+# -----------------------------
+country_names = dict(zip(cluster['ISO'], cluster['Country']))
+country_names.update(zip(ipd_data['ISO'], ipd_data['countryname']))
+country_options = sorted(
+    ({'label': f"{name} ({iso})", 'value': iso} for iso, name in country_names.items() if isinstance(iso, str)),
+    key=lambda o: o['label']
+)
+
+# Creator session token -> ClubDistanceTracker, so each edit is an
+# incremental add/remove. A worker that has not seen the session (or
+# evicted it) rebuilds the tracker from the submitted members.
+CREATOR_SESSIONS_MAX = 512
+creator_sessions = OrderedDict()
+creator_sessions_lock = threading.Lock()
+
+
+def creator_tracker(session_id):
+    with creator_sessions_lock:
+        tracker = creator_sessions.get(session_id)
+        if tracker is None:
+            tracker = ClubDistanceTracker(ipd_data['ISO'].tolist(), ipd_data['geopolitical_distance'])
+            creator_sessions[session_id] = tracker
+            while len(creator_sessions) > CREATOR_SESSIONS_MAX:
+                creator_sessions.popitem(last=False)
+        creator_sessions.move_to_end(session_id)
+    return tracker
+
+
+mark_startup('club tools')
+
+
+# -----------------------------
+# Callback registry
+# -----------------------------
+# Callbacks are collected here and registered on every app create_app()
+# builds, so the module can be imported without constructing an app.
+_callbacks = []
+
+
+def app_callback(*args, **kwargs):
+    def decorator(func):
+        _callbacks.append((args, kwargs, func))
+        return func
+    return decorator
+
+
+# -----------------------------
+# Instrumentation
+# -----------------------------
+class Histogram:
+    """Minimal Prometheus histogram with labels (cumulative buckets, sum, count)."""
+
+    def __init__(self, name, doc, buckets):
+        self.name = name
+        self.doc = doc
+        self.buckets = tuple(buckets) + (float('inf'),)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._series.setdefault(key, [[0] * len(self.buckets), 0.0, 0])
+            series[0][np.searchsorted(self.buckets, value)] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.doc}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (counts, total, count) in sorted(self._series.items()):
+                labels = ",".join(f'{k}="{v}"' for k, v in key)
+                cumulative = 0
+                for bound, n in zip(self.buckets, counts):
+                    cumulative += n
+                    le = "+Inf" if bound == float('inf') else repr(bound)
+                    lines.append(f'{self.name}_bucket{{{labels},le="{le}"}} {cumulative}')
+                lines.append(f"{self.name}_sum{{{labels}}} {total}")
+                lines.append(f"{self.name}_count{{{labels}}} {count}")
+        return lines
+
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+PAYLOAD_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+callback_stage_seconds = Histogram(
+    "green_swan_callback_stage_seconds",
+    "Callback wall time by stage: model compute, figure build, serialization.",
+    LATENCY_BUCKETS)
+callback_seconds = Histogram(
+    "green_swan_callback_seconds", "Total wall time of a callback request.", LATENCY_BUCKETS)
+callback_payload_bytes = Histogram(
+    "green_swan_callback_payload_bytes", "Response payload size of a callback request.", PAYLOAD_BUCKETS)
+
+
+class timed:
+    """Attribute the enclosed block to a stage of the current callback request."""
+
+    def __init__(self, stage):
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        if has_request_context():
+            stages = g.setdefault('metrics_stages', {})
+            stages[self.stage] = stages.get(self.stage, 0.0) + time.perf_counter() - self.start
+
+
+def instrumented(func):
+    """Record a callback's run time; request hooks split it into stages."""
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            if has_request_context():
+                g.metrics_callback = func.__name__
+                g.metrics_callback_seconds = time.perf_counter() - start
+    return wrapper
+
+
+def _start_callback_timer():
+    if request.path.endswith('_dash-update-component'):
+        g.metrics_start = time.perf_counter()
+
+
+def _record_callback_metrics(response):
+    start = g.pop('metrics_start', None)
+    if start is None:
+        return response
+    total = time.perf_counter() - start
+    name = g.get('metrics_callback', 'unknown')
+    in_callback = g.get('metrics_callback_seconds', total)
+    model = g.get('metrics_stages', {}).get('model', 0.0)
+    callback_seconds.observe(total, callback=name)
+    callback_stage_seconds.observe(model, callback=name, stage='model')
+    callback_stage_seconds.observe(max(in_callback - model, 0.0), callback=name, stage='figure')
+    callback_stage_seconds.observe(max(total - in_callback, 0.0), callback=name, stage='serialization')
+    callback_payload_bytes.observe(response.calculate_content_length() or 0, callback=name)
+    return response
+
+
+def cache_metric_lines():
+    # Engine caches are per year: one series per loaded panel, labelled by
+    # year (an evicted year's counters restart when it is loaded again)
+    caches = {}
+    panels = [base_panel] + [year_panels.peek(year) for year in PANEL_FILES if year != BASE_YEAR]
+    for panel in filter(None, panels):
+        engine = panel.engine
+        for name, cache in (('cluster_results', engine.results), ('cluster_bases', engine.bases),
+                            ('cluster_sweeps', engine.sweeps), ('cluster_stability', engine.stabilities)):
+            caches[f'cache="{name}",year="{panel.year}"'] = cache.stats()
+    caches['cache="year_panels"'] = year_panels.stats()
+    caches['cache="cluster_transitions"'] = transitions.stats()
+    caches['cache="transition_labels"'] = transition_labels.stats()
+    for name, fn in (('highlight_markers', highlight_markers), ('bubble_markers', bubble_markers),
+                     ('explorer_fragment', explorer_fragment),
+                     ('explorer_figure', explorer_base_figure), ('matrix_figure', climate_club_matrix_figure),
+                     ('club_distance_figure', club_distance_figure)):
+        info = fn.cache_info()
+        caches[f'cache="{name}"'] = {'hits': info.hits, 'misses': info.misses, 'size': info.currsize}
+    lines = []
+    for metric, field, kind in (('green_swan_cache_hits_total', 'hits', 'counter'),
+                                ('green_swan_cache_misses_total', 'misses', 'counter'),
+                                ('green_swan_cache_entries', 'size', 'gauge')):
+        lines.append(f"# TYPE {metric} {kind}")
+        lines.extend(f'{metric}{{{labels}}} {stats[field]}' for labels, stats in caches.items())
+    return lines
+
+
+def metrics():
+    lines = []
+    for histogram in (callback_seconds, callback_stage_seconds, callback_payload_bytes):
+        lines.extend(histogram.render())
+    lines.extend(cache_metric_lines())
+    return Response("\n".join(lines) + "\n", mimetype='text/plain; version=0.0.4')
+
+
+def register_metrics(server):
+    server.before_request(_start_callback_timer)
+    server.after_request(_record_callback_metrics)
+    server.add_url_rule('/metrics', 'metrics', metrics)
+
+
+# -----------------------------
+# JSON API
+# -----------------------------
+def similar_api():
+    """GET /api/similar?iso=KEN&features=a,b&n=10[&year=2023] -> nearest countries."""
+    iso = request.args.get('iso', '').upper()
+    features = [f for f in request.args.get('features', '').split(',') if f]
+    year = request.args.get('year', type=int)
+    n_neighbors = max(1, min(request.args.get('n', 10, type=int), 100))
+    unknown = [f for f in features if f not in year_panel(year).model.index]
+    if len(set(features)) < 2 or unknown:
+        return jsonify(error="need at least 2 known features", unknown=unknown), 400
+    start = time.perf_counter()
+    neighbors = similar_countries(features, iso, n_neighbors, year)
+    if neighbors is None:
+        return jsonify(error=f"unknown ISO code {iso!r}"), 404
+    return jsonify(iso=iso, year=year_panel(year).year, features=sorted(set(features)), neighbors=neighbors,
+                   elapsed_ms=round((time.perf_counter() - start) * 1000, 3))
+
+
+def register_api(server):
+    server.add_url_rule('/api/similar', 'similar', similar_api)
+
 # -----------------------------
 # Layout
 # -----------------------------
-app.layout = dbc.Container([
-    dbc.NavbarSimple(
-        brand="Country Clustering Dashboard",
-        color="primary",
-        dark=True,
-        className="mb-4"
-    ),
-    dcc.Tabs(id="tabs", value='tab-cluster', children=[
-
-        # ------------------- CLUSTERING TAB -------------------
-        dcc.Tab(label='Clustering Visualization', value='tab-cluster', children=[
-            dbc.Container([
-                # --- Feature selection ---
-                dbc.Row([
-                    dbc.Col([
-                        html.Label("Macro Stability"),
-                        dcc.Dropdown(
-                            id='macro-dropdown',
-                            options=[
-                                {'label': variable_labels[v], 'value': v} 
-                                for v in dimensions["Macro Stability"]
-                            ],
-                            value=["Sovereign risk"],
-                            multi=True
-                        )
-                    ], width=3),
-                    dbc.Col([
-                        html.Label("Nature"),
-                        dcc.Dropdown(
-                            id='nature-dropdown',
-                            options=[
-                                {'label': variable_labels[v], 'value': v} 
-                                for v in dimensions["Nature"]
-                            ],
-                            value=["Biocapacity", "Renewable_value_scaled", "Mineral_value_scaled"],
-                            multi=True
-                        )
-                    ], width=3),
-                    dbc.Col([
-                        html.Label("Green Competitiveness"),
-                        dcc.Dropdown(
-                            id='green-dropdown',
-                            options=[
-                                {'label': variable_labels[v], 'value': v} 
-                                for v in dimensions["Green Competitiveness"]
-                            ],
-                            value=["BLI_scaled", "GCP_scaled"],
-                            multi=True
-                        )
-                    ], width=3),
-                    dbc.Col([
-                        html.Label("Climate Adaptation & Vulnerability"),
-                        dcc.Dropdown(
-                            id='climate-dropdown',
-                            options=[
-                                {'label': variable_labels[v], 'value': v} 
-                                for v in dimensions["Climate Adaptation and vulnerability"]
-                            ],
-                            value=["IMF-Adapted Readiness score_scaled","Vulnerability score_scaled"],
-                            multi=True
-                        )
-                    ], width=3)
-                ], className="mb-4"),
-
-                # --- Visualization mode and filters ---
-                dbc.Row([
-                    dbc.Col([
-                        html.Label("Visualization Mode"),
-                        dcc.RadioItems(
-                            id='viz-mode',
-                            options=[
-                                {'label': 'Highlight Groups', 'value': 'highlight'},
-                                {'label': 'Bubble Size', 'value': 'bubble'}
-                            ],
-                            value='highlight',
-                            inline=True
-                        )
-                    ], width=6),
-
-                    dbc.Col([
-                        html.Label("Group Filter"),
-                        dcc.Dropdown(
-                            id='group-filter-cluster',
-                            options=group_filter_options,
-                            value='All',
-                            clearable=False
-                        )
-                    ], width=3),
-
-                    dbc.Col([
-                        html.Label("Bubble Size Variable"),
-                        dcc.Dropdown(
-                            id='bubble-variable',
-                            options=[
-                                {'label': 'CO₂ emissions', 'value': 'CO2_per_capita'},
-                                {'label': 'Climate Finance needs', 'value': 'Needs'}
-                            ],
-                            value='CO2_per_capita',
-                            clearable=False
-                        )
-                    ], width=3)
-                ], className="mb-4"),
-
-                # --- Cluster slider ---
-                dbc.Row([
-                    dbc.Col([
-                        html.Label("Select Number of Clusters"),
-                        dcc.Slider(
-                            id='cluster-slider',
-                            min=2, max=6,
-                            step=1, value=4,
-                            marks={i: str(i) for i in range(2, 7)}
-                        )
-                    ], width=12)
-                ], className="mb-4"),
-
-                # --- Graph output ---
-                dbc.Row([
-                    dbc.Col(dcc.Graph(id='cluster-graph'), width=12)
-                ])
-            ])
-        ]),
-
-        # ------------------- DATA EXPLORER TAB -------------------
-        dcc.Tab(label='Data Explorer', value='tab-data', children=[
-            dbc.Container([
-                dbc.Row([
-                    dbc.Col([
-                        html.Label("Select Variable"),
-                        dcc.Dropdown(
-                            id='variable-dropdown',
-                            options=[
-                                {
-                                    'label': variable_labels.get(col, col),
-                                    'value': col
-                                }
-                                for col in variable_definitions.keys()
-                            ],
-                            value=list(variable_definitions.keys())[0],
-                            clearable=False
-                        ),
-                        html.Br(),
-                        dash_table.DataTable(
-                            id='variable-table',
+def year_slider(slider_id):
+    """Year selector row; hidden while only the base year is available."""
+    return dbc.Row([
+        dbc.Col([
+            html.Label("Year"),
+            dcc.Slider(
+                id=slider_id,
+                min=PANEL_YEARS[0], max=PANEL_YEARS[-1],
+                step=None, value=BASE_YEAR,
+                marks={year: str(year) for year in PANEL_YEARS}
+            )
+        ], width=12)
+    ], className="mb-4", style=None if len(PANEL_YEARS) > 1 else {'display': 'none'})
+
+
+def build_layout():
+    return dbc.Container([
+        dbc.NavbarSimple(
+            brand="Country Clustering Dashboard",
+            color="primary",
+            dark=True,
+            className="mb-4"
+        ),
+        dcc.Tabs(id="tabs", value='tab-cluster', children=[
+
+            # ------------------- CLUSTERING TAB -------------------
+            dcc.Tab(label='Clustering Visualization', value='tab-cluster', children=[
+                dbc.Container([
+                    # --- Feature selection ---
+                    dbc.Row([
+                        dbc.Col([
+                            html.Label("Macro Stability"),
+                            dcc.Dropdown(
+                                id='macro-dropdown',
+                                options=[
+                                    {'label': variable_labels[v], 'value': v} 
+                                    for v in dimensions["Macro Stability"]
+                                ],
+                                value=["Sovereign risk"],
+                                multi=True
+                            )
+                        ], width=3),
+                        dbc.Col([
+                            html.Label("Nature"),
+                            dcc.Dropdown(
+                                id='nature-dropdown',
+                                options=[
+                                    {'label': variable_labels[v], 'value': v} 
+                                    for v in dimensions["Nature"]
+                                ],
+                                value=["Biocapacity", "Renewable_value_scaled", "Mineral_value_scaled"],
+                                multi=True
+                            )
+                        ], width=3),
+                        dbc.Col([
+                            html.Label("Green Competitiveness"),
+                            dcc.Dropdown(
+                                id='green-dropdown',
+                                options=[
+                                    {'label': variable_labels[v], 'value': v} 
+                                    for v in dimensions["Green Competitiveness"]
+                                ],
+                                value=["BLI_scaled", "GCP_scaled"],
+                                multi=True
+                            )
+                        ], width=3),
+                        dbc.Col([
+                            html.Label("Climate Adaptation & Vulnerability"),
+                            dcc.Dropdown(
+                                id='climate-dropdown',
+                                options=[
+                                    {'label': variable_labels[v], 'value': v} 
+                                    for v in dimensions["Climate Adaptation and vulnerability"]
+                                ],
+                                value=["IMF-Adapted Readiness score_scaled","Vulnerability score_scaled"],
+                                multi=True
+                            )
+                        ], width=3)
+                    ], className="mb-4"),
+
+                    # --- Visualization mode and filters ---
+                    dbc.Row([
+                        dbc.Col([
+                            html.Label("Visualization Mode"),
+                            dcc.RadioItems(
+                                id='viz-mode',
+                                options=[
+                                    {'label': 'Highlight Groups', 'value': 'highlight'},
+                                    {'label': 'Bubble Size', 'value': 'bubble'}
+                                ],
+                                value='highlight',
+                                inline=True
+                            )
+                        ], width=6),
+
+                        dbc.Col([
+                            html.Label("Group Filter"),
+                            dcc.Dropdown(
+                                id='group-filter-cluster',
+                                options=group_filter_options,
+                                value='All',
+                                clearable=False
+                            )
+                        ], width=3),
+
+                        dbc.Col([
+                            html.Label("Bubble Size Variable"),
+                            dcc.Dropdown(
+                                id='bubble-variable',
+                                options=[
+                                    {'label': 'CO₂ emissions', 'value': 'CO2_per_capita'},
+                                    {'label': 'Climate Finance needs', 'value': 'Needs'}
+                                ],
+                                value='CO2_per_capita',
+                                clearable=False
+                            )
+                        ], width=3)
+                    ], className="mb-4"),
+
+                    # --- Clustering engine and slider ---
+                    dbc.Row([
+                        dbc.Col([
+                            html.Label("Clustering Method"),
+                            dcc.RadioItems(
+                                id='cluster-engine',
+                                options=[{'label': label, 'value': method} for method, label in CLUSTER_METHODS.items()],
+                                value='kmeans',
+                                inline=True
+                            )
+                        ], width=3),
+                        dbc.Col([
+                            html.Label("Select Number of Clusters"),
+                            dcc.Slider(
+                                id='cluster-slider',
+                                min=2, max=6,
+                                step=1, value=4,
+                                marks={i: str(i) for i in range(2, 7)}
+                            )
+                        ], width=9)
+                    ], className="mb-4"),
+                    year_slider('year-cluster'),
+
+                    # --- Graph output ---
+                    dbc.Row([
+                        dbc.Col(dcc.Graph(id='cluster-graph'), width=12)
+                    ]),
+                    dbc.Row([
+                        dbc.Col(dcc.Graph(id='cluster-dendrogram'), width=12)
+                    ], id='dendrogram-row', style={'display': 'none'}),
+
+                    # --- Similar countries ---
+                    dbc.Row([
+                        dbc.Col([
+                            html.Label("Countries like"),
+                            dcc.Dropdown(id='similar-country', options=country_options, placeholder="Select a country")
+                        ], width=6),
+                        dbc.Col([
+                            html.Label("Neighbours"),
+                            dcc.Input(id='similar-count', type='number', value=10, min=1, max=50, step=1)
+                        ], width=3)
+                    ], className="mb-2"),
+                    dbc.Row([
+                        dbc.Col(dash_table.DataTable(
+                            id='similar-table',
                             columns=[
                                 {"name": "ISO", "id": "ISO"},
-                                {"name": "Value", "id": "Value"}
+                                {"name": "Country", "id": "Country"},
+                                {"name": "Distance", "id": "distance"}
                             ],
-                            page_size=15,
-                            style_table={'overflowX': 'auto'},
+                            page_size=10,
                             style_cell={'textAlign': 'left', 'padding': '5px'},
                             style_header={'backgroundColor': '#f8f9fa', 'fontWeight': 'bold'}
-                        )
-                    ], width=5),
-
-                    dbc.Col([
-                        dcc.Graph(id='variable-map')
-                    ], width=7)
+                        ), width=9)
+                    ], className="mb-4"),
+
+                    # --- Model selection ---
+                    dbc.Row([
+                        dbc.Col([
+                            html.Label("Model Selection: k range"),
+                            dcc.RangeSlider(
+                                id='sweep-range',
+                                min=2, max=12,
+                                step=1, value=[2, 8],
+                                marks={i: str(i) for i in range(2, 13)}
+                            )
+                        ], width=9),
+                        dbc.Col(dbc.Button("Run k sweep", id='sweep-run', color='secondary'), width=3)
+                    ], className="mb-4"),
+                    dbc.Row([
+                        dbc.Col(dcc.Graph(id='sweep-graph'), width=12)
+                    ], id='sweep-row', style={'display': 'none'}),
+
+                    # --- Cluster stability ---
+                    dbc.Row([
+                        dbc.Col([
+                            html.Label("Stability: resamples"),
+                            dcc.Input(id='stability-resamples', type='number', value=200, min=10, max=2000, step=10)
+                        ], width=3),
+                        dbc.Col([
+                            html.Label("Resampling"),
+                            dcc.RadioItems(
+                                id='stability-resample',
+                                options=[
+                                    {'label': 'Bootstrap countries', 'value': 'bootstrap'},
+                                    {'label': 'Random seeds', 'value': 'seed'}
+                                ],
+                                value='bootstrap',
+                                inline=True
+                            )
+                        ], width=6),
+                        dbc.Col(dbc.Button("Run stability", id='stability-run', color='secondary'), width=3)
+                    ], className="mb-4"),
+                    dbc.Row([
+                        dbc.Col(dcc.Graph(id='stability-graph'), width=12)
+                    ], id='stability-row', style={'display': 'none'}),
+
+                    # --- Cluster transitions ---
+                    dbc.Row([
+                        dbc.Col([
+                            html.Label("Transitions"),
+                            dcc.RadioItems(
+                                id='transition-axis',
+                                options=[
+                                    {'label': 'Across k (model selection range)', 'value': 'k'},
+                                    {'label': 'Across years', 'value': 'year'}
+                                ],
+                                value='k',
+                                inline=True
+                            )
+                        ], width=9),
+                        dbc.Col(dbc.Button("Show transitions", id='transition-run', color='secondary'), width=3)
+                    ], className="mb-4"),
+                    dbc.Row([
+                        dbc.Col(dcc.Graph(id='transition-graph'), width=12)
+                    ], id='transition-row', style={'display': 'none'}),
+                    dcc.Store(id='cluster-store')
                 ])
-            ])
-        ]),
-
-        # ------------------- COMPARE CLIMATE CLUB TAB -------------------
-        dcc.Tab(label='Compare Climate Club', value='tab-ClimateClub', children=[
-            dbc.Container([
-                dbc.Row([
-                    dbc.Col([
-                        html.Label("Group Filter"),
-                        dcc.Dropdown(
-                            id='group-filter-club',
-                            options=group_filter_options,
-                            value='All',
-                            clearable=False
-                        ),
-                        html.Div(id="club-output", style={"marginTop": "20px"})
+            ]),
+
+            # ------------------- DATA EXPLORER TAB -------------------
+            dcc.Tab(label='Data Explorer', value='tab-data', children=[
+                dbc.Container([
+                    dbc.Row([
+                        dbc.Col([
+                            html.Label("Select Variable"),
+                            dcc.Dropdown(
+                                id='variable-dropdown',
+                                options=[
+                                    {
+                                        'label': variable_labels.get(col, col),
+                                        'value': col
+                                    }
+                                    for col in variable_definitions.keys()
+                                ],
+                                value=list(variable_definitions.keys())[0],
+                                clearable=False
+                            ),
+                            html.Br(),
+                            year_slider('year-explorer'),
+                            dash_table.DataTable(
+                                id='variable-table',
+                                columns=[
+                                    {"name": "ISO", "id": "ISO"},
+                                    {"name": "Value", "id": "Value"}
+                                ],
+                                page_size=15,
+                                style_table={'overflowX': 'auto'},
+                                style_cell={'textAlign': 'left', 'padding': '5px'},
+                                style_header={'backgroundColor': '#f8f9fa', 'fontWeight': 'bold'}
+                            )
+                        ], width=5),
+
+                        dbc.Col([
+                            dcc.Graph(id='variable-map'),
+                            dcc.Store(id='variable-map-drawn', data=False)
+                        ], width=7)
                     ])
                 ])
-            ])
-        ]),
-         # ------------------- CLIMATE CLUB MATRIX TAB -------------------
-        dcc.Tab(label='Climate Club Matrix', value='tab-ClimateClubMatrix', children=[
-            dbc.Container([
-                dbc.Row([
-                    dbc.Col([
-                        dcc.Graph(id="climate-club-matrix")
-                    ], width=12)
+            ]),
+
+            # ------------------- COMPARE CLIMATE CLUB TAB -------------------
+            dcc.Tab(label='Compare Climate Club', value='tab-ClimateClub', children=[
+                dbc.Container([
+                    dbc.Row([
+                        dbc.Col([
+                            html.Label("Group Filter"),
+                            dcc.Dropdown(
+                                id='group-filter-club',
+                                options=group_filter_options,
+                                value='All',
+                                clearable=False
+                            ),
+                            html.Br(),
+                            html.Label("Distance Measure"),
+                            dcc.Dropdown(
+                                id='distance-source',
+                                options=distance_options(),
+                                value=IDEAL_POINTS,
+                                clearable=False
+                            ),
+                            html.Div(id="club-output", style={"marginTop": "20px"})
+                        ])
+                    ]),
+                    dbc.Row([
+                        dbc.Col([
+                            dcc.Graph(id="club-distance-heatmap"),
+                            dcc.Store(id="club-distance-loaded", data=False)
+                        ], width=12)
+                    ])
                 ])
-            ])
-        ]),
-
-        # ------------------- CLIMATE CLUB CREATOR TAB -------------------
-        dcc.Tab(label='Climate Club Creator', value='tab-ClimateClubCreator', children=[
-            dbc.Container([
-                dbc.Row([
-                    dbc.Col([
-                        html.Label("Group Filter"),
-                        dcc.Dropdown(
-                            id='group-filter-creator',
-                            options=group_filter_options,
-                            value='All',
-                            clearable=False
-                        ),
-                        html.Div(id="club-output-creator", style={"marginTop": "20px"})
+            ]),
+             # ------------------- CLIMATE CLUB MATRIX TAB -------------------
+            dcc.Tab(label='Climate Club Matrix', value='tab-ClimateClubMatrix', children=[
+                dbc.Container([
+                    dbc.Row([
+                        dbc.Col([
+                            dcc.Graph(id="climate-club-matrix"),
+                            dcc.Store(id="matrix-loaded", data=False)
+                        ], width=12)
+                    ])
+                ])
+            ]),
+
+            # ------------------- CLIMATE CLUB CREATOR TAB -------------------
+            dcc.Tab(label='Climate Club Creator', value='tab-ClimateClubCreator', children=[
+                dbc.Container([
+                    dbc.Row([
+                        dbc.Col([
+                            html.Label("Seed Club"),
+                            dcc.Dropdown(
+                                id='group-filter-creator',
+                                options=group_filter_options,
+                                value='All',
+                                clearable=False
+                            ),
+                            html.Br(),
+                            html.Label("Members"),
+                            dcc.Dropdown(
+                                id='creator-members',
+                                options=country_options,
+                                value=[],
+                                multi=True,
+                                placeholder="Add countries..."
+                            ),
+                            html.Br(),
+                            html.Label("Distance Measure"),
+                            dcc.Dropdown(
+                                id='creator-distance-source',
+                                options=distance_options(),
+                                value=IDEAL_POINTS,
+                                clearable=False
+                            ),
+                            dcc.Store(id='creator-session'),
+                            html.Div(id="club-output-creator", style={"marginTop": "20px"}),
+                            html.Hr(),
+
+                            # --- Club optimizer ---
+                            html.H5("Optimize Club"),
+                            dbc.Row([
+                                dbc.Col([
+                                    html.Label("Max Average Distance"),
+                                    dcc.Input(id='optimizer-max-distance', type='number', value=0.5, min=0, step=0.05)
+                                ], width=3),
+                                dbc.Col([
+                                    html.Label("Objective"),
+                                    dcc.RadioItems(
+                                        id='optimizer-objective',
+                                        options=[
+                                            {'label': 'Largest club', 'value': 'size'},
+                                            {'label': 'Most ambitious', 'value': 'ambition'}
+                                        ],
+                                        value='size',
+                                        inline=True
+                                    )
+                                ], width=3),
+                                dbc.Col([
+                                    html.Label("Required Members"),
+                                    dcc.Dropdown(id='optimizer-required', options=country_options, value=[], multi=True)
+                                ], width=3),
+                                dbc.Col([
+                                    html.Label("Excluded Members"),
+                                    dcc.Dropdown(id='optimizer-excluded', options=country_options, value=[], multi=True)
+                                ], width=3)
+                            ]),
+                            dbc.Button("Optimize", id='optimizer-run', color='primary', className='mt-2'),
+                            html.Div(id="optimizer-output", style={"marginTop": "10px"})
+                        ])
                     ])
                 ])
             ])
         ])
-    ])
-], fluid=True)
+    ], fluid=True)
 
 # -----------------------------
-# Cluster graph callback
+# Cluster model callback (stage 1)
 # -----------------------------
+@app_callback(
+    Output('cluster-slider', 'max'),
+    Output('cluster-slider', 'marks'),
+    Output('cluster-slider', 'value'),
+    Input('cluster-engine', 'value'),
+    State('cluster-slider', 'value')
+)
+@instrumented
+def update_cluster_slider(method, n_clusters):
+    k_max = cluster_k_max.get(method, 6)
+    return k_max, {i: str(i) for i in range(2, k_max + 1)}, min(n_clusters or 4, k_max)
 
-# -----------------------------
-# Cluster graph callback
-# -----------------------------
-@app.callback(
-    Output('cluster-graph', 'figure'),
+
+@app_callback(
+    Output('cluster-store', 'data'),
     Input('cluster-slider', 'value'),
     Input('macro-dropdown', 'value'),
     Input('nature-dropdown', 'value'),
     Input('green-dropdown', 'value'),
     Input('climate-dropdown', 'value'),
-    Input('viz-mode', 'value'),
-    Input('group-filter-cluster', 'value'),
-    Input('bubble-variable', 'value')
+    Input('cluster-engine', 'value'),
+    Input('year-cluster', 'value')
 )
-def update_clusters(n_clusters, macro_vars, nature_vars, green_vars, climate_vars, viz_mode, group_filter, bubble_var):
+@instrumented
+def compute_clusters(n_clusters, macro_vars, nature_vars, green_vars, climate_vars, method='kmeans', year=None):
     selected_features = (macro_vars or []) + (nature_vars or []) + (green_vars or []) + (climate_vars or [])
+    panel = year_panel(year)
+    # Features this year lacks are left out of the fit and listed in the title
+    missing = [f for f in selected_features if f not in panel.model.index]
+    selected_features = [f for f in selected_features if f in panel.model.index]
     if len(selected_features) < 2:
-        return px.scatter(title="Select at least 2 features")
+        return None
+
+    # PCA + clustering (memoized per year, feature set, k and method)
+    with timed('model'):
+        model = panel.engine.fit(selected_features, n_clusters, method)
+    return {
+        'year': panel.year,
+        'features': list(model['features']),
+        'k': model['k'],
+        'method': model['method'],
+        'PC1': model['PC1'].tolist(),
+        'PC2': model['PC2'].tolist(),
+        'cluster': model['labels'].tolist(),
+        'missing': missing
+    }
+
 
-    df = cluster.copy()
+def message_figure(title):
+    """Empty figure that only shows a title, for invalid selections."""
+    return go.Figure(layout={'title': {'text': title}})
 
-    # PCA
-    X = df[selected_features].fillna(0)
-    pca = PCA(n_components=2)
-    components = pca.fit_transform(X)
-    df['PC1'] = components[:, 0]
-    df['PC2'] = components[:, 1]
 
-    # KMeans
-    kmeans = KMeans(n_clusters=n_clusters, random_state=42)
-    df['cluster'] = kmeans.fit_predict(X)
-    df['cluster_name'] = df['cluster'].map(lambda c: cluster_names.get(c, f"Cluster {c}"))
+def triggered_id():
+    """Id of the input that fired the current callback (None outside one)."""
+    try:
+        return callback_context.triggered_id
+    except MissingCallbackContextException:
+        return None
 
-    # --------------------------
-    # ✅ Dynamic Group Selection
-    # --------------------------
+
+def group_selection(group_filter, panel=None):
+    """Boolean mask over the rows of a year panel (default: base year) for the selected group."""
+    panel = panel or base_panel
     if group_filter == 'All':
-        df['is_selected'] = True
-    else:
-        col_name = f"is_{group_filter.replace('+', 'plus')}"  # handles BRICS+
-        if col_name in df.columns:
-            df['is_selected'] = df[col_name]
-        else:
-            df['is_selected'] = False
+        return np.ones(len(panel.iso), dtype=bool)
+    return club_registry.members(group_filter, panel.rows)
+
 
+def highlight_style(is_selected):
+    """Marker opacity and size for Highlight Groups mode."""
+    opacity = np.where(is_selected, 1.0, 0.2)
+    marker_size = np.where(is_selected, 10, 3)
+    return opacity, marker_size
+
+
+# Above this many points the cluster graph switches to WebGL marker traces
+# and one text trace labelling only highlighted points or the largest bubbles
+WEBGL_THRESHOLD = int(os.environ.get("GREEN_SWAN_WEBGL_THRESHOLD", 1000))
+LABEL_TOP_N = int(os.environ.get("GREEN_SWAN_LABEL_TOP_N", 50))
+
+
+def large_plot(panel):
+    return len(panel.iso) > WEBGL_THRESHOLD
+
+
+@lru_cache(maxsize=1024)
+def highlight_markers(group_filter, year=BASE_YEAR):
+    """Precomputed highlight-mode marker arrays and labelled rows for a group."""
+    is_selected = group_selection(group_filter, year_panel(year))
+    opacity, marker_size = highlight_style(is_selected)
+    labelled = np.flatnonzero(is_selected) if group_filter != 'All' else np.array([], dtype=np.intp)
+    return _read_only({'opacity': opacity, 'size': marker_size, 'labelled': labelled})
+
+
+@lru_cache(maxsize=1024)
+def bubble_markers(bubble_var, year=BASE_YEAR):
+    """Precomputed bubble sizes, size reference and labelled rows for a variable."""
+    panel = year_panel(year)
+    if bubble_var in panel.features.index:
+        sizes = np.nan_to_num(panel.features.column(bubble_var), nan=0.1)
+    else:
+        sizes = np.full(len(panel.iso), 0.1, dtype=np.float32)
+    labelled = np.sort(np.argsort(sizes, kind='stable')[::-1][:LABEL_TOP_N])
+    # Area-scaled markers with the largest at 25px, as px.scatter(size_max=25)
+    return _read_only({'size': sizes, 'sizeref': 2.0 * float(sizes.max()) / 25 ** 2, 'labelled': labelled})
+
+
+def label_trace(pc1, pc2, iso, rows):
+    """Text-only WebGL trace with the ISO labels of `rows`."""
+    return go.Scattergl(x=pc1[rows], y=pc2[rows], mode='text', text=iso[rows],
+                        showlegend=False, hoverinfo='skip', name='labels')
+
+
+def cluster_name_array(labels):
+    codes, inverse = np.unique(np.asarray(labels), return_inverse=True)
+    return np.array([cluster_names.get(c, f"Cluster {c}") for c in codes.tolist()])[inverse]
+
+
+def cluster_groups(labels):
+    """(cluster name, row indices) per cluster, sorted by cluster name."""
+    codes, inverse = np.unique(np.asarray(labels), return_inverse=True)
+    order = np.argsort(inverse, kind='stable')
+    bounds = np.searchsorted(inverse[order], np.arange(len(codes) + 1))
+    groups = [(cluster_names.get(c, f"Cluster {c}"), order[bounds[i]:bounds[i + 1]])
+              for i, c in enumerate(codes.tolist())]
+    return sorted(groups, key=lambda group: group[0])
+
+
+def build_cluster_figure(cluster_data, viz_mode, group_filter, bubble_var):
+    # Traces index into shared read-only arrays; no per-request frame is built
+    pc1 = np.asarray(cluster_data['PC1'])
+    pc2 = np.asarray(cluster_data['PC2'])
+    groups = cluster_groups(cluster_data['cluster'])
+    year = cluster_data.get('year', BASE_YEAR)
+    panel = year_panel(year)
+    iso = panel.iso
+    large = large_plot(panel)
+
+    # Large plots: markers only, labels for a subset in a trailing text trace
+    trace = go.Scattergl if large else go.Scatter
+    mode = 'markers' if large else 'markers+text'
+    fig = go.Figure()
     if viz_mode == 'highlight':
-        df['opacity'] = df['is_selected'].map({True: 1.0, False: 0.2})
-        df['marker_size'] = df['is_selected'].map({True: 10, False: 3})
-        #df['border_width'] = df['is_selected'].map({True: 3, False: 0.5})
-
-        fig = go.Figure()
-        for cluster_name, group in df.groupby('cluster_name'):
-            fig.add_trace(go.Scatter(
-                x=group['PC1'],
-                y=group['PC2'],
-                mode='markers+text',
-                text=group['ISO'],
+        markers = highlight_markers(group_filter, year)
+        for cluster_name, rows in groups:
+            fig.add_trace(trace(
+                x=pc1[rows],
+                y=pc2[rows],
+                mode=mode,
+                text=iso[rows],
                 name=cluster_name,
                 marker=dict(
-                    size=group['marker_size'],
+                    size=markers['size'][rows],
                     color=color_map.get(cluster_name, 'gray'),
-                    opacity=group['opacity'],
-                    #line=dict(width=group['border_width'], color='black')
+                    opacity=markers['opacity'][rows]
                 ),
                 textposition='top center'
             ))
     else:  # Bubble mode
-        df['marker_size'] = df[bubble_var].fillna(0.1)
-        fig = px.scatter(
-            df, x='PC1', y='PC2',
-            color='cluster_name',
-            text='ISO',
-            hover_name='ISO',
-            size='marker_size',
-            color_discrete_map=color_map,
-            size_max=25
-        )
+        markers = bubble_markers(bubble_var, year)
+        for cluster_name, rows in groups:
+            fig.add_trace(trace(
+                x=pc1[rows],
+                y=pc2[rows],
+                mode=mode,
+                text=iso[rows],
+                hovertext=iso[rows],
+                name=cluster_name,
+                legendgroup=cluster_name,
+                marker=dict(
+                    size=markers['size'][rows],
+                    sizemode='area',
+                    sizeref=markers['sizeref'],
+                    color=color_map.get(cluster_name, 'gray')
+                ),
+                hovertemplate=(f"<b>%{{hovertext}}</b><br><br>cluster_name={cluster_name}"
+                               f"<br>PC1=%{{x}}<br>PC2=%{{y}}<br>{bubble_var}=%{{marker.size}}<extra></extra>")
+            ))
 
+    if large:
+        fig.add_trace(label_trace(pc1, pc2, iso, markers['labelled']))
+
+    title = f"Country Clustering {panel.year} ({'Highlight' if viz_mode == 'highlight' else 'Bubble'} mode)"
+    if cluster_data.get('missing'):
+        title += f"<br><sup>Not available for {panel.year}, left out: {', '.join(cluster_data['missing'])}</sup>"
     fig.update_traces(textposition='top center', textfont=dict(size=9))
     fig.update_layout(
-        title=f"Country Clustering ({'Highlight' if viz_mode == 'highlight' else 'Bubble'} mode)",
+        title=title,
         title_font_size=20,
         xaxis_title="Principal Component 1",
         yaxis_title="Principal Component 2",
@@ -956,60 +2649,404 @@ def update_clusters(n_clusters, macro_vars, nature_vars, green_vars, climate_var
         legend=dict(bgcolor='rgba(0,0,0,0)', bordercolor='LightGray', borderwidth=1)
     )
 
-    #print(df[['ISO', 'is_selected'] + [col for col in df.columns if col.startswith('is_')]].head(40))
+    return fig
+
+
+def highlight_patch(cluster_data, group_filter):
+    """Patch only marker opacity/size of the highlight-mode traces."""
+    year = cluster_data.get('year', BASE_YEAR)
+    panel = year_panel(year)
+    markers = highlight_markers(group_filter, year)
+    patched = Patch()
+    # Traces are added in cluster-name order, see cluster_groups
+    groups = cluster_groups(cluster_data['cluster'])
+    for i, (_, rows) in enumerate(groups):
+        patched['data'][i]['marker']['opacity'] = markers['opacity'][rows].tolist()
+        patched['data'][i]['marker']['size'] = markers['size'][rows].tolist()
+    if large_plot(panel):
+        # The label trace follows the cluster traces and shows the new group
+        labelled = markers['labelled']
+        patched['data'][len(groups)]['x'] = np.asarray(cluster_data['PC1'])[labelled].tolist()
+        patched['data'][len(groups)]['y'] = np.asarray(cluster_data['PC2'])[labelled].tolist()
+        patched['data'][len(groups)]['text'] = panel.iso[labelled].tolist()
+    return patched
 
+
+# -----------------------------
+# Dendrogram callback
+# -----------------------------
+def build_dendrogram_figure(features, n_clusters, year=BASE_YEAR):
+    from scipy.cluster.hierarchy import dendrogram
+    panel = year_panel(year)
+    tree = panel.engine.tree(features)
+    # Cut height between the merges that leave k and k - 1 clusters
+    heights = tree[:, 2]
+    threshold = (heights[-n_clusters] + heights[-n_clusters + 1]) / 2 if n_clusters > 1 else heights[-1] + 1
+    dendro = dendrogram(tree, labels=panel.iso.tolist(), color_threshold=threshold,
+                        above_threshold_color='gray', no_plot=True)
+
+    # Match scipy's per-subtree colours to the cluster palette of the scatter
+    labels = panel.engine.fit(features, n_clusters, 'ward')['labels']
+    link_colors = {'gray': 'gray'}
+    for row, color in zip(dendro['leaves'], dendro['leaves_color_list']):
+        name = cluster_names.get(labels[row], f"Cluster {labels[row]}")
+        link_colors.setdefault(color, color_map.get(name, 'gray'))
+
+    # One line trace per colour, links separated by gaps
+    segments = {}
+    for xs, ys, color in zip(dendro['icoord'], dendro['dcoord'], dendro['color_list']):
+        seg_x, seg_y = segments.setdefault(link_colors.get(color, 'gray'), ([], []))
+        seg_x.extend(xs + [None])
+        seg_y.extend(ys + [None])
+
+    fig = go.Figure()
+    for color, (xs, ys) in segments.items():
+        fig.add_trace(go.Scatter(x=xs, y=ys, mode='lines', line=dict(color=color, width=1),
+                                 hoverinfo='skip', showlegend=False))
+    fig.add_hline(y=threshold, line=dict(color='black', width=1, dash='dash'))
+    fig.update_layout(
+        title=f"Ward Dendrogram (cut at {n_clusters} clusters)",
+        xaxis=dict(tickmode='array', tickvals=[5 + 10 * i for i in range(len(dendro['ivl']))],
+                   ticktext=dendro['ivl'], tickfont=dict(size=7)),
+        yaxis_title="Ward distance",
+        plot_bgcolor='white'
+    )
     return fig
 
 
+@app_callback(
+    Output('cluster-dendrogram', 'figure'),
+    Output('dendrogram-row', 'style'),
+    Input('cluster-store', 'data')
+)
+@instrumented
+def update_dendrogram(cluster_data):
+    if cluster_data is None or cluster_data.get('method') != 'ward':
+        return no_update, {'display': 'none'}
+    return (build_dendrogram_figure(cluster_data['features'], cluster_data['k'], cluster_data.get('year', BASE_YEAR)),
+            {'display': 'block'})
+
 
+# -----------------------------
+# Model selection callback
+# -----------------------------
+def build_sweep_figure(sweep, current_k=None):
+    from plotly.subplots import make_subplots
+    fig = make_subplots(rows=1, cols=4, subplot_titles=("Inertia", "Silhouette", "Calinski-Harabasz", "Gap"))
+    for col, metric in enumerate(['inertia', 'silhouette', 'calinski_harabasz', 'gap'], start=1):
+        error = dict(type='data', array=sweep['gap_sd']) if metric == 'gap' else None
+        fig.add_trace(go.Scatter(x=sweep['k'], y=sweep[metric], error_y=error, mode='lines+markers',
+                                 name=metric, showlegend=False), row=1, col=col)
+        if current_k in sweep['k']:
+            fig.add_vline(x=current_k, line=dict(color='gray', width=1, dash='dash'), row=1, col=col)
+    fig.update_xaxes(title_text="Number of clusters", dtick=1)
+    gap_note = f", gap statistic suggests k={sweep['gap_k']}" if sweep['gap_k'] is not None else ""
+    fig.update_layout(
+        title=f"Model Selection ({CLUSTER_METHODS.get(sweep['method'], sweep['method'])}{gap_note})",
+        plot_bgcolor='white'
+    )
+    return fig
 
 
+@app_callback(
+    Output('sweep-graph', 'figure'),
+    Output('sweep-row', 'style'),
+    Input('sweep-run', 'n_clicks'),
+    State('sweep-range', 'value'),
+    State('cluster-store', 'data'),
+    prevent_initial_call=True
+)
+@instrumented
+def update_model_selection(n_clicks, k_range, cluster_data):
+    if cluster_data is None:
+        return message_figure("Select at least 2 features"), {'display': 'block'}
+    k_min, k_max = k_range
+    with timed('model'):
+        engine = year_panel(cluster_data.get('year')).engine
+        sweep = engine.sweep(cluster_data['features'], k_min, k_max, cluster_data.get('method', 'kmeans'))
+    return build_sweep_figure(sweep, cluster_data['k']), {'display': 'block'}
 
 
 # -----------------------------
-# Data explorer callback
+# Cluster stability callback
 # -----------------------------
-@app.callback(
-    Output('variable-table', 'data'),
-    Output('variable-map', 'figure'),
-    Input('variable-dropdown', 'value')
+def build_stability_figure(stability, labels, iso=cluster_iso, n_least=20):
+    from plotly.subplots import make_subplots
+    # Order countries by cluster, most stable first, so blocks line up
+    order = np.lexsort((-stability['stability'], labels))
+    ordered = iso[order]
+    least = np.argsort(stability['stability'], kind='stable')[:n_least]
+
+    fig = make_subplots(rows=1, cols=2, column_widths=[0.7, 0.3], horizontal_spacing=0.12,
+                        subplot_titles=("Co-assignment share", f"Least stable {n_least} countries"))
+    fig.add_trace(go.Heatmap(
+        z=stability['coassignment'][np.ix_(order, order)], x=ordered, y=ordered,
+        zmin=0, zmax=255, colorscale='Blues', showscale=False,
+        hovertemplate="%{x} / %{y}: %{z}/255<extra></extra>"
+    ), row=1, col=1)
+    fig.add_trace(go.Bar(
+        x=stability['stability'][least], y=iso[least], orientation='h',
+        marker_color=[color_map.get(cluster_names.get(c), 'gray') for c in labels[least]],
+        showlegend=False
+    ), row=1, col=2)
+    fig.update_xaxes(showticklabels=False, row=1, col=1)
+    fig.update_yaxes(showticklabels=False, autorange='reversed', row=1, col=1)
+    fig.update_xaxes(range=[0, 1], title_text="Share of resamples in reference cluster", row=1, col=2)
+    fig.update_yaxes(autorange='reversed', row=1, col=2)
+    fig.update_layout(
+        title=f"Cluster Stability ({stability['n_resamples']} resamples)",
+        height=600,
+        plot_bgcolor='white'
+    )
+    return fig
+
+
+@app_callback(
+    Output('stability-resample', 'options'),
+    Output('stability-resample', 'value'),
+    Input('cluster-engine', 'value'),
+    State('stability-resample', 'value')
 )
-def update_data_explorer(selected_variable):
-    df = cluster.copy()
+@instrumented
+def update_stability_resample(method, resample):
+    # Ward is deterministic, so refitting with another seed cannot vary
+    ward = method == 'ward'
+    options = [
+        {'label': 'Bootstrap countries', 'value': 'bootstrap'},
+        {'label': 'Random seeds', 'value': 'seed', 'disabled': ward}
+    ]
+    return options, 'bootstrap' if ward else resample
+
+
+@app_callback(
+    Output('stability-graph', 'figure'),
+    Output('stability-row', 'style'),
+    Input('stability-run', 'n_clicks'),
+    State('stability-resamples', 'value'),
+    State('stability-resample', 'value'),
+    State('cluster-store', 'data'),
+    prevent_initial_call=True
+)
+@instrumented
+def update_stability(n_clicks, n_resamples, resample, cluster_data):
+    if cluster_data is None:
+        return message_figure("Select at least 2 features"), {'display': 'block'}
+    method = cluster_data.get('method', 'kmeans')
+    panel = year_panel(cluster_data.get('year'))
+    # The input's min/max are client-side only
+    n_resamples = max(10, min(int(n_resamples or 200), 2000))
+    with timed('model'):
+        stability = panel.engine.stability(cluster_data['features'], cluster_data['k'], method,
+                                           n_resamples, resample)
+        labels = panel.engine.fit(cluster_data['features'], cluster_data['k'], method)['labels']
+    return build_stability_figure(stability, labels, panel.iso), {'display': 'block'}
+
+
+# -----------------------------
+# Similar countries callback
+# -----------------------------
+@app_callback(
+    Output('similar-table', 'data'),
+    Input('similar-country', 'value'),
+    Input('similar-count', 'value'),
+    Input('cluster-store', 'data')
+)
+@instrumented
+def update_similar_countries(iso, n_neighbors, cluster_data):
+    if not iso or cluster_data is None:
+        return []
+    with timed('model'):
+        neighbors = similar_countries(cluster_data['features'], iso, int(n_neighbors or 10), cluster_data.get('year'))
+    return neighbors or []
+
+
+# -----------------------------
+# Cluster transitions callback
+# -----------------------------
+def rgba(hex_color, alpha):
+    r, g, b = (int(hex_color[i:i + 2], 16) for i in (1, 3, 5))
+    return f"rgba({r},{g},{b},{alpha})"
+
+
+def build_transition_figure(transition, axis):
+    stages = transition['stages']
+    assignment = transition['assignment']
+    nodes, labels, colors = {}, [], []
+    for j, (year, k) in enumerate(stages):
+        stage = f"k={k}" if axis == 'k' else str(year)
+        for c in np.unique(assignment[:, j][assignment[:, j] >= 0]).tolist():
+            name = cluster_names.get(c, f"Cluster {c}")
+            nodes[j, c] = len(labels)
+            labels.append(f"{stage}: {name}")
+            colors.append(color_map.get(name, '#7f7f7f'))
+
+    source, target, value = [], [], []
+    for j, counts in enumerate(transition['counts']):
+        for a, b in zip(*np.nonzero(counts)):
+            source.append(nodes[j, int(a)])
+            target.append(nodes[j + 1, int(b)])
+            value.append(int(counts[a, b]))
+
+    fig = go.Figure(go.Sankey(
+        arrangement='snap',
+        node=dict(label=labels, color=colors, pad=12, thickness=14),
+        link=dict(source=source, target=target, value=value,
+                  color=[rgba(colors[i], 0.35) for i in source])
+    ))
+    fig.update_layout(
+        title=f"Cluster Transitions ({'across k' if axis == 'k' else 'across years'})",
+        height=500
+    )
+    return fig
+
+
+@app_callback(
+    Output('transition-graph', 'figure'),
+    Output('transition-row', 'style'),
+    Input('transition-run', 'n_clicks'),
+    Input('transition-axis', 'value'),
+    State('sweep-range', 'value'),
+    State('cluster-store', 'data'),
+    prevent_initial_call=True
+)
+@instrumented
+def update_transitions(n_clicks, axis, k_range, cluster_data):
+    if cluster_data is None:
+        return message_figure("Select at least 2 features"), {'display': 'block'}
+    year = cluster_data.get('year', BASE_YEAR)
+    k = cluster_data['k']
+    method = cluster_data.get('method', 'kmeans')
+    features = cluster_data['features']
+    if axis == 'year':
+        stages = [(y, k) for y in PANEL_YEARS if all(f in panel_meta(y)['columns'] for f in features)]
+    else:
+        k_min, k_max = k_range
+        stages = [(year, kk) for kk in range(k_min, min(k_max, cluster_k_max.get(method, 6)) + 1)]
+    if len(stages) < 2:
+        return message_figure("Transitions need at least two years or two values of k"), {'display': 'block'}
+
+    anchor = (year, k) if (year, k) in stages else stages[0]
+    with timed('model'):
+        transition = cluster_transitions(features, method, stages, anchor)
+    return build_transition_figure(transition, axis), {'display': 'block'}
+
+
+# -----------------------------
+# Cluster graph callback (stage 2)
+# -----------------------------
+@app_callback(
+    Output('cluster-graph', 'figure'),
+    Input('cluster-store', 'data'),
+    Input('viz-mode', 'value'),
+    Input('group-filter-cluster', 'value'),
+    Input('bubble-variable', 'value')
+)
+@instrumented
+def update_clusters(cluster_data, viz_mode, group_filter, bubble_var):
+    if cluster_data is None:
+        return message_figure("Select at least 2 features")
+
+    # Group filter only restyles highlight markers; bubble mode ignores it
+    trigger = triggered_id()
+    if trigger == 'group-filter-cluster':
+        if viz_mode != 'highlight':
+            return no_update
+        return highlight_patch(cluster_data, group_filter)
+    if trigger == 'bubble-variable' and viz_mode != 'bubble':
+        return no_update
+
+    return build_cluster_figure(cluster_data, viz_mode, group_filter, bubble_var)
+
 
-    # Check variable existence
-    if selected_variable not in df.columns:
-        fig = px.choropleth(title="Variable not found")
-        return [], fig
 
-    # Ensure numeric or fallback
-    if not pd.api.types.is_numeric_dtype(df[selected_variable]):
-        df[selected_variable] = pd.to_numeric(df[selected_variable], errors='coerce')
 
-    df[selected_variable] = df[selected_variable].fillna(0)
 
-    # Table
-    table_data = df[['ISO', selected_variable]].rename(columns={selected_variable: "Value"})
-    table_records = table_data.to_dict('records')
 
-    # Choropleth
+
+# -----------------------------
+# Data explorer callback
+# -----------------------------
+@lru_cache(maxsize=1024)
+def explorer_fragment(variable, year=BASE_YEAR):
+    """Per-variable, per-year pieces of the Data Explorer: map values, labels and table rows."""
+    panel = year_panel(year)
+    if variable not in panel.features.index:
+        return None
+    # Shortest float32 repr, so the table shows the stored precision only
+    values = np.nan_to_num(panel.features.column(variable), nan=0.0)
+    values = [float(v) for v in values.astype(str)]
+    return {
+        'locations': panel.iso.tolist(),
+        'z': values,
+        'title': f"{variable} ({panel.year})",
+        'hovertemplate': f"<b>%{{hovertext}}</b><br><br>ISO=%{{location}}<br>{variable}=%{{z}}<extra></extra>",
+        'records': [{'ISO': iso, 'Value': value} for iso, value in zip(panel.iso.tolist(), values)]
+    }
+
+
+# Base-year fragments are built before fork; other years on first use
+explorer_fragments = {
+    variable: explorer_fragment(variable)
+    for variable in variable_definitions if variable in feature_matrix.index
+}
+mark_startup('explorer fragments')
+
+
+# One figure per variable for the base year and each cached panel year
+@lru_cache(maxsize=len(variable_definitions) * (YEAR_CACHE + 1))
+def explorer_base_figure(variable, year=BASE_YEAR):
+    """Full choropleth for the first render; later switches are patched onto it."""
+    import plotly.express as px
+    fragment = explorer_fragment(variable, year)
     fig = px.choropleth(
-        df,
-        locations="ISO",
-        color=selected_variable,
-        hover_name="ISO",
+        locations=fragment['locations'],
+        color=fragment['z'],
+        hover_name=fragment['locations'],
         color_continuous_scale="turbid",
-        title=f"{selected_variable} (2023)",
-        labels={selected_variable: selected_variable}
+        title=fragment['title'],
+        labels={'color': variable}
     )
-
+    fig.update_traces(hovertemplate=fragment['hovertemplate'])
     fig.update_geos(showcountries=True)
     fig.update_layout(
         geo=dict(showframe=False, showcoastlines=True),
         plot_bgcolor='white'
     )
+    return fig
+
+
+def explorer_patch(variable, year=BASE_YEAR):
+    fragment = explorer_fragment(variable, year)
+    patched = Patch()
+    patched['data'][0]['z'] = fragment['z']
+    patched['data'][0]['hovertemplate'] = fragment['hovertemplate']
+    patched['layout']['title']['text'] = fragment['title']
+    patched['layout']['coloraxis']['colorbar']['title']['text'] = variable
+    return patched
+
 
-    return table_records, fig
+@app_callback(
+    Output('variable-table', 'data'),
+    Output('variable-map', 'figure'),
+    Output('variable-map-drawn', 'data'),
+    Input('variable-dropdown', 'value'),
+    Input('year-explorer', 'value'),
+    State('variable-map-drawn', 'data')
+)
+@instrumented
+def update_data_explorer(selected_variable, year=BASE_YEAR, drawn=False):
+    fragment = explorer_fragment(selected_variable, year) if selected_variable in variable_definitions else None
+    # Check variable existence
+    if fragment is None:
+        fig = message_figure("Variable not found")
+        return [], fig, False
+
+    # Variable changes patch the drawn map; the first render, a render after
+    # a message figure and year changes (other years can cover other
+    # countries) send the full choropleth
+    if drawn and triggered_id() == 'variable-dropdown':
+        return fragment['records'], explorer_patch(selected_variable, year), no_update
+    return fragment['records'], explorer_base_figure(selected_variable, year), True
 
 
 
@@ -1017,13 +3054,19 @@ def update_data_explorer(selected_variable):
 # -----------------------------
 # Compare Climate Club callback
 # -----------------------------
-@app.callback(
+@app_callback(
     Output("club-output", "children"),
-    Input("group-filter-club", "value")
+    Input("group-filter-club", "value"),
+    Input("distance-source", "value")
 )
-def update_average_distance(club_name):
-    iso_list = get_iso_list(club_name)
-    avg_dist = average_distance(ipd_data, iso_list)
+@instrumented
+def update_average_distance(club_name, source=IDEAL_POINTS):
+    if source in (None, IDEAL_POINTS):
+        in_club = club_registry.members(club_name, ipd_rows)
+        avg_dist = mean_pairwise_distance(ipd_data['geopolitical_distance'].to_numpy()[in_club])
+    else:
+        matrix = distance_matrix(source)
+        avg_dist = matrix.mean_distance(np.flatnonzero(club_registry.members(club_name, matrix.registry_rows)))
     
     if avg_dist is None:
         return f"No data available for {club_name}."
@@ -1033,26 +3076,184 @@ def update_average_distance(club_name):
 
 
 # -----------------------------
-# Climate Club Matrix callback
+# Club distance heatmap callback
 # -----------------------------
-@app.callback(
-    Output("climate-club-matrix", "figure"),
-    Input("tabs", "value")  # refresh when switching tabs
+@lru_cache(maxsize=8)
+def club_distance_figure(source=IDEAL_POINTS):
+    """Within- and between-club mean geopolitical distance for every club filter."""
+    clubs = [option for option in group_filter_options if option['value'] != 'All']
+    if source == IDEAL_POINTS:
+        membership = np.column_stack([club_registry.members(option['value'], ipd_rows) for option in clubs])
+        means, _ = club_pair_distances(ipd_data['geopolitical_distance'].to_numpy(), membership)
+    else:
+        matrix = distance_matrix(source)
+        membership = np.column_stack([club_registry.members(option['value'], matrix.registry_rows)
+                                      for option in clubs])
+        means, _ = matrix.club_means(membership)
+    labels = [option['value'] for option in clubs]
+    fig = go.Figure(go.Heatmap(
+        z=np.round(means, 3), x=labels, y=labels,
+        colorscale='Viridis', colorbar=dict(title="Mean distance"),
+        hovertemplate="%{y} vs %{x}: %{z}<extra></extra>"
+    ))
+    fig.update_layout(
+        title=f"Average Geopolitical Distance Within (diagonal) and Between Clubs ({distance_label(source)})",
+        height=700,
+        yaxis=dict(autorange='reversed'),
+        plot_bgcolor='white'
+    )
+    return fig
+
+
+@app_callback(
+    Output("club-distance-heatmap", "figure"),
+    Output("club-distance-loaded", "data"),
+    Input("tabs", "value"),
+    Input("distance-source", "value"),
+    State("club-distance-loaded", "data")
 )
-def update_climate_club_matrix(tab_value):
-    # Example dataset (0–10 scale)
+@instrumented
+def update_club_distance_heatmap(tab_value, source=IDEAL_POINTS, loaded=False):
+    # Sent when the Compare tab is first opened and when the measure changes
+    if tab_value != 'tab-ClimateClub' or (loaded and triggered_id() != 'distance-source'):
+        return no_update, no_update
+    return club_distance_figure(source or IDEAL_POINTS), True
+
+
+# -----------------------------
+# Climate Club Creator callbacks
+# -----------------------------
+@app_callback(
+    Output("creator-members", "value"),
+    Input("group-filter-creator", "value")
+)
+@instrumented
+def seed_creator_club(club_name):
+    if club_name == 'All':
+        return []
+    return [iso for iso in get_iso_list(club_name) if iso in country_names]
+
+
+@app_callback(
+    Output("club-output-creator", "children"),
+    Output("creator-session", "data"),
+    Input("creator-members", "value"),
+    Input("cluster-store", "data"),
+    Input("creator-distance-source", "value"),
+    State("creator-session", "data")
+)
+@instrumented
+def update_creator_club(members, cluster_data, source=IDEAL_POINTS, session_id=None):
+    session_id = session_id or uuid.uuid4().hex
+    members = members or []
+    tracker = creator_tracker(session_id)
+
+    # Apply only the difference from the last state this worker saw
+    with tracker.lock:
+        selected = set(members)
+        for iso in tracker.members - selected:
+            tracker.remove(iso)
+        for iso in selected - tracker.members:
+            tracker.add(iso)
+        avg_dist = tracker.mean()
+        n_scored = len(tracker.members)
+    if source not in (None, IDEAL_POINTS):
+        # Dyadic distances: one block read for the current members
+        matrix = distance_matrix(source)
+        rows = matrix.rows(selected)
+        avg_dist, n_scored = matrix.mean_distance(rows), len(rows)
+
+    lines = [
+        html.P(f"Members: {len(selected)} ({n_scored} with distances)"),
+        html.P(f"Average pairwise geopolitical distance: {avg_dist:.3f}" if avg_dist is not None
+               else "Average pairwise geopolitical distance: select at least 2 countries with distances")
+    ]
+
+    if cluster_data is not None and selected:
+        iso = year_panel(cluster_data.get('year')).iso
+        in_club = np.isin(iso, list(selected)) & ~pd.Index(iso).duplicated()
+        names = cluster_name_array(np.asarray(cluster_data['cluster'])[in_club])
+        mix = pd.Series(names).value_counts().sort_index()
+        not_clustered = len(selected) - in_club.sum()
+        lines.append(html.P("Cluster mix:"))
+        lines.append(html.Ul(
+            [html.Li(f"{name}: {count}", style={'color': color_map.get(name, 'gray')}) for name, count in mix.items()]
+            + ([html.Li(f"Not clustered: {not_clustered}")] if not_clustered else [])
+        ))
+
+    return lines, session_id
+
+
+@app_callback(
+    Output("creator-members", "value", allow_duplicate=True),
+    Output("optimizer-output", "children"),
+    Input("optimizer-run", "n_clicks"),
+    State("creator-members", "value"),
+    State("optimizer-max-distance", "value"),
+    State("optimizer-objective", "value"),
+    State("optimizer-required", "value"),
+    State("optimizer-excluded", "value"),
+    prevent_initial_call=True
+)
+@instrumented
+def run_club_optimizer(n_clicks, members, max_distance, objective, required, excluded):
+    if max_distance is None:
+        return no_update, "Enter a maximum average distance."
+
+    with timed('model'):
+        result = optimize_club(members or [], max_distance, required or [], excluded or [], objective)
+    if not result['feasible']:
+        return no_update, (f"Required members alone have an average distance of {result['mean']:.3f}, "
+                           f"above the budget of {max_distance}.")
 
-    club_summary_df["x_jitter"] = club_summary_df["Economic Integration"] + np.random.uniform(-0.1, 0.1, size=len(club_summary_df))
-    club_summary_df["y_jitter"] = club_summary_df["Climate Ambition"] + np.random.uniform(-0.1, 0.1, size=len(club_summary_df))
+    mean = f"{result['mean']:.3f}" if result['mean'] is not None else "n/a"
+    return result['members'], (f"Found a club of {len(result['members'])} countries "
+                               f"(average distance {mean}, ambition score {result['ambition']:.1f}).")
+
+
+# -----------------------------
+# Climate Club Matrix callback
+# -----------------------------
+MATRIX_SPREAD = 0.2
+
+
+def matrix_positions(summary):
+    """Deterministic, collision-free positions for clubs sharing a score cell.
+
+    Clubs with the same (Economic Integration, Climate Ambition) scores
+    are spread evenly on a small circle around that point, in name order.
+    """
+    x = summary["Economic Integration"].to_numpy(dtype=float)
+    y = summary["Climate Ambition"].to_numpy(dtype=float)
+    x_pos, y_pos = x.copy(), y.copy()
+    cells = summary.groupby(["Economic Integration", "Climate Ambition"]).indices
+    names = summary["Club Name"].to_numpy()
+    for rows in cells.values():
+        if len(rows) < 2:
+            continue
+        rows = rows[np.argsort(names[rows], kind='stable')]
+        angles = np.pi / 2 + 2 * np.pi * np.arange(len(rows)) / len(rows)
+        x_pos[rows] += MATRIX_SPREAD * np.cos(angles)
+        y_pos[rows] += MATRIX_SPREAD * np.sin(angles)
+    return x_pos, y_pos
+
+
+@lru_cache(maxsize=1)
+def climate_club_matrix_figure():
+    """Club matrix scatter, built once from the read-only club summary."""
+    import plotly.express as px
+    df = club_summary_df.copy()
+    df["x_pos"], df["y_pos"] = matrix_positions(df)
 
     # Scatter plot
     fig = px.scatter(
-        club_summary_df,
-        x="x_jitter",
-        y="y_jitter",
+        df,
+        x="x_pos",
+        y="y_pos",
         size='Number of Members',
         color='Average Pairwise Geopolitical Distance',
         hover_name='Club Name',
+        hover_data={'x_pos': False, 'y_pos': False, 'Economic Integration': True, 'Climate Ambition': True},
         size_max=60,
         color_continuous_scale='RdBu',
         title="Climate Clubs: Ambition vs Economic Integration (0–5 scale)"
@@ -1088,11 +3289,70 @@ def update_climate_club_matrix(tab_value):
 
     return fig
 
+
+@app_callback(
+    Output("climate-club-matrix", "figure"),
+    Output("matrix-loaded", "data"),
+    Input("tabs", "value"),
+    State("matrix-loaded", "data")
+)
+@instrumented
+def update_climate_club_matrix(tab_value, loaded):
+    # Only send the (static) figure the first time the Matrix tab is opened
+    if tab_value != 'tab-ClimateClubMatrix' or loaded:
+        return no_update, no_update
+    return climate_club_matrix_figure(), True
+
+# -----------------------------
+# App Initialization
+# -----------------------------
+def create_app():
+    """Build the Dash app on top of the module's read-only data.
+
+    Data, club registry and summaries are built at import, so running
+    gunicorn with --preload shares them copy-on-write across workers;
+    heavy libraries are only imported by the first request that needs them.
+    """
+    start = time.perf_counter()
+    app = Dash(__name__, external_stylesheets=[dbc.themes.BOOTSTRAP], suppress_callback_exceptions=True)
+    app.layout = build_layout()
+    for args, kwargs, func in _callbacks:
+        app.callback(*args, **kwargs)(func)
+    register_metrics(app.server)
+    register_api(app.server)
+    startup_timings['create_app'] = time.perf_counter() - start
+    if os.environ.get("GREEN_SWAN_STARTUP_REPORT"):
+        print(startup_report(), flush=True)
+    return app
+
+
+_default_app = None
+
+
+def __getattr__(name):
+    # `app` and `server` (e.g. gunicorn green_swan_cluster_app:server) are
+    # created on first access rather than at import
+    global _default_app
+    if name in ('app', 'server'):
+        if _default_app is None:
+            _default_app = create_app()
+        return _default_app if name == 'app' else _default_app.server
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
 # -----------------------------
 # Run App
 # -----------------------------
 if __name__ == '__main__':
-    app.run(debug=True)
+    app = create_app()
+    if '--startup-report' in sys.argv:
+        print(startup_report())
+    elif '--validate-backend' in sys.argv:
+        for row in validate_backend():
+            print(f"k={row['k']}  ARI={row['ari']:.3f}  inertia ratio={row['inertia_ratio']:.3f}  "
+                  f"|corr(PC1)|={row['pc1_corr']:.4f}")
+    else:
+        app.run(debug=True)
 
 
 
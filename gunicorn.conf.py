@@ -0,0 +1,34 @@
+"""Gunicorn settings for the Green Swan dashboard.
+
+    gunicorn -c gunicorn.conf.py
+
+The app is imported once in the master (preload), so the CSVs, club
+registry, clustering inputs and layout are built before fork and shared
+copy-on-write by every worker.
+"""
+import gc
+import os
+
+wsgi_app = "green_swan_cluster_app:server"
+bind = os.environ.get("GREEN_SWAN_BIND", "0.0.0.0:8050")
+# Exported, so the app sizes its per-worker process pools for this count
+workers = int(os.environ.setdefault("WEB_CONCURRENCY", "2"))
+preload_app = True
+timeout = 120
+
+
+def when_ready(server):
+    import green_swan_cluster_app
+    server.log.info(green_swan_cluster_app.startup_report())
+
+
+def pre_fork(server, worker):
+    # Move everything built so far out of the collector's generations so its
+    # passes do not touch (and un-share) the preloaded pages in each worker.
+    gc.freeze()
+
+
+def post_worker_init(worker):
+    # Each worker owns a club optimizer pool; start it before the first request
+    import green_swan_cluster_app
+    green_swan_cluster_app.warm_optimizer_pool()
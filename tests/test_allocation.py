@@ -0,0 +1,47 @@
+import tracemalloc
+
+import pytest
+
+import benchmark
+import green_swan_cluster_app as gs
+
+FIGURE_CACHES = (gs.highlight_markers, gs.bubble_markers, gs.explorer_fragment, gs.explorer_base_figure)
+
+
+@pytest.fixture(scope='module')
+def store():
+    f = benchmark.FEATURES
+    return gs.compute_clusters(4, f['macro'], f['nature'], f['green'], f['climate'])
+
+
+def peak_allocation(fn):
+    """Peak traced bytes of one call with the figure caches cold."""
+    # The first call pays one-off imports and plotly validator setup
+    fn()
+    for cache in FIGURE_CACHES:
+        cache.cache_clear()
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def budget():
+    fixed, per_unit = benchmark.ALLOCATION_BUDGET
+    return fixed + per_unit * len(gs.cluster)
+
+
+@pytest.mark.parametrize('viz_mode', ['highlight', 'bubble'])
+def test_update_clusters_within_budget(store, viz_mode):
+    assert peak_allocation(lambda: gs.update_clusters(store, viz_mode, 'OECD', 'Needs')) <= budget()
+
+
+def test_highlight_patch_within_budget(store):
+    assert peak_allocation(lambda: gs.highlight_patch(store, 'EU')) <= budget()
+
+
+def test_update_data_explorer_within_budget():
+    variable = next(iter(gs.explorer_fragments))
+    assert peak_allocation(lambda: gs.update_data_explorer(variable)) <= budget()
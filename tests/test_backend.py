@@ -0,0 +1,22 @@
+import pytest
+
+import green_swan_cluster_app as gs
+
+# Streaming K-Means may settle in a slightly worse local optimum; PCA is exact up to sign
+MAX_INERTIA_RATIO = 1.05
+MIN_PC1_CORR = 0.99
+
+
+@pytest.fixture(scope='module')
+def agreement():
+    return gs.validate_backend()
+
+
+def test_scalable_inertia_close_to_exact(agreement):
+    for row in agreement:
+        assert row['inertia_ratio'] <= MAX_INERTIA_RATIO, row
+
+
+def test_scalable_pc1_matches_exact(agreement):
+    for row in agreement:
+        assert row['pc1_corr'] >= MIN_PC1_CORR, row
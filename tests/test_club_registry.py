@@ -0,0 +1,74 @@
+import numpy as np
+import pytest
+
+import green_swan_cluster_app as gs
+from green_swan_cluster_app import ClubRegistry
+
+
+def random_registry(rng, n_countries=60, n_clubs=150):
+    # 150 clubs span three uint64 words, so bits 63/64 and 127/128 are exercised
+    iso = [f"C{i:03d}" for i in range(n_countries)]
+    clubs = {f"club{j}": [c for c in iso if rng.random() < 0.3] for j in range(n_clubs)}
+    clubs['club63'] = iso[:5]
+    clubs['club64'] = iso[3:8]
+    return iso, clubs
+
+
+def test_registry_matches_isin_on_country_data():
+    iso = gs.cluster['ISO'].to_numpy()
+    for name, members in gs.club_membership.items():
+        expected = np.isin(iso, members)
+        np.testing.assert_array_equal(gs.club_registry.members(name, gs.cluster_rows), expected, err_msg=name)
+
+
+def test_matrix_and_members_across_word_boundaries():
+    iso, clubs = random_registry(np.random.default_rng(0))
+    registry = ClubRegistry(clubs)
+    assert registry.n_words == 3
+    rows = registry.rows(iso)
+    expected = np.column_stack([np.isin(iso, members) for members in clubs.values()])
+    np.testing.assert_array_equal(registry.matrix(rows), expected)
+    for j, name in enumerate(clubs):
+        np.testing.assert_array_equal(registry.members(name, rows), expected[:, j])
+
+
+@pytest.mark.parametrize('names', [
+    ['club63', 'club64'],
+    ['club0', 'club63', 'club64', 'club127', 'club128', 'club149'],
+    ['club10'],
+])
+def test_union_and_intersection(names):
+    iso, clubs = random_registry(np.random.default_rng(1))
+    registry = ClubRegistry(clubs)
+    rows = registry.rows(iso)
+    in_clubs = np.column_stack([np.isin(iso, clubs[name]) for name in names])
+    np.testing.assert_array_equal(registry.union(names, rows), in_clubs.any(axis=1))
+    np.testing.assert_array_equal(registry.intersection(names, rows), in_clubs.all(axis=1))
+
+
+def test_intersection_of_no_or_unknown_clubs_is_empty():
+    iso, clubs = random_registry(np.random.default_rng(2))
+    registry = ClubRegistry(clubs)
+    rows = registry.rows(iso)
+    assert not registry.intersection([], rows).any()
+    assert not registry.intersection(['club1', 'nope'], rows).any()
+    assert len(registry.intersection([])) == len(registry.iso)
+
+
+def test_clubs_of():
+    iso, clubs = random_registry(np.random.default_rng(3))
+    registry = ClubRegistry(clubs)
+    for code in iso:
+        assert registry.clubs_of(code) == [name for name, members in clubs.items() if code in members]
+    assert registry.clubs_of('ZZZ') == []
+
+
+def test_unknown_iso_rows_belong_to_no_club():
+    iso, clubs = random_registry(np.random.default_rng(4))
+    registry = ClubRegistry(clubs, iso_codes=['EXTRA'])
+    rows = registry.rows(['ZZZ', iso[0], 'QQQ', 'EXTRA'])
+    assert rows[0] == rows[2] == len(registry.iso)
+    assert not registry.matrix(rows)[[0, 2, 3]].any()
+    names = list(clubs)
+    assert not registry.union(names, rows)[[0, 2, 3]].any()
+    np.testing.assert_array_equal(registry.matrix(rows)[1], [iso[0] in members for members in clubs.values()])
@@ -0,0 +1,172 @@
+import itertools
+import math
+
+import numpy as np
+import pytest
+
+import green_swan_cluster_app as gs
+from green_swan_cluster_app import (
+    ClubDistanceTracker, DistanceMatrix, club_average_distances, club_pair_distances, mean_pairwise_distance
+)
+
+
+def brute_mean(values):
+    pairs = list(itertools.combinations(values, 2))
+    if not pairs:
+        return None
+    return sum(abs(a - b) for a, b in pairs) / len(pairs)
+
+
+def brute_pair_mean(values, a_rows, b_rows):
+    dists = [abs(values[i] - values[j]) for i in a_rows for j in b_rows if i != j]
+    return sum(dists) / len(dists) if dists else math.nan
+
+
+@pytest.mark.parametrize('values', [
+    [],
+    [0.7],
+    [0.7, -1.2],
+    [1.0, 1.0, 1.0],
+    [0.5, -0.5, 0.5, 2.0, -0.5, 0.5],
+    list(np.random.default_rng(0).normal(size=50)),
+])
+def test_mean_pairwise_distance_matches_brute_force(values):
+    expected = brute_mean(values)
+    result = mean_pairwise_distance(values)
+    if expected is None:
+        assert result is None
+    else:
+        assert result == pytest.approx(expected)
+
+
+def test_mean_pairwise_distance_nan_poisons():
+    assert math.isnan(mean_pairwise_distance([0.1, np.nan, 0.3]))
+
+
+def random_clubs(rng, n=40, n_clubs=6):
+    # Rounded values give plenty of ties; clubs of size 0, 1 and 2 included
+    values = np.round(rng.normal(size=n), 1)
+    membership = rng.random((n, n_clubs)) < 0.3
+    membership[:, 0] = False
+    membership[:, 1] = False
+    membership[3, 1] = True
+    membership[:, 2] = False
+    membership[[4, 9], 2] = True
+    return values, membership
+
+
+def test_club_average_distances_matches_brute_force():
+    values, membership = random_clubs(np.random.default_rng(1))
+    result = club_average_distances(values, membership)
+    for club in range(membership.shape[1]):
+        expected = brute_mean(list(values[membership[:, club]]))
+        if expected is None:
+            assert math.isnan(result[club])
+        else:
+            assert result[club] == pytest.approx(expected)
+
+
+def test_club_average_distances_nan_poisons_only_its_clubs():
+    values, membership = random_clubs(np.random.default_rng(2))
+    values[5] = np.nan
+    membership[5, 3] = True
+    membership[5, 4] = False
+    result = club_average_distances(values, membership)
+    assert math.isnan(result[3])
+    clean = values[membership[:, 4]]
+    assert result[4] == pytest.approx(brute_mean(list(clean)))
+
+
+def test_club_pair_distances_matches_brute_force():
+    values, membership = random_clubs(np.random.default_rng(3))
+    means, pairs = club_pair_distances(values, membership)
+    for a, b in itertools.product(range(membership.shape[1]), repeat=2):
+        a_rows, b_rows = np.flatnonzero(membership[:, a]), np.flatnonzero(membership[:, b])
+        expected = brute_pair_mean(values, a_rows, b_rows)
+        assert pairs[a, b] == sum(1 for i in a_rows for j in b_rows if i != j)
+        if math.isnan(expected):
+            assert math.isnan(means[a, b])
+        else:
+            assert means[a, b] == pytest.approx(expected)
+        if a == b and len(a_rows) >= 2:
+            assert means[a, a] == pytest.approx(brute_mean(list(values[a_rows])))
+
+
+def test_club_pair_distances_nan_poisons_rows_and_columns():
+    values, membership = random_clubs(np.random.default_rng(4))
+    values[7] = np.nan
+    membership[7, 3] = True
+    membership[7, 4:] = False
+    means, _ = club_pair_distances(values, membership)
+    assert np.isnan(means[3, :]).all() and np.isnan(means[:, 3]).all()
+    a_rows, b_rows = np.flatnonzero(membership[:, 4]), np.flatnonzero(membership[:, 5])
+    assert means[4, 5] == pytest.approx(brute_pair_mean(values, a_rows, b_rows))
+
+
+def test_club_distance_tracker_add_remove_sequence():
+    rng = np.random.default_rng(5)
+    iso = [f"C{i:02d}" for i in range(30)]
+    values = np.round(rng.normal(size=30), 1)
+    lookup = dict(zip(iso, values))
+    tracker = ClubDistanceTracker(iso, values)
+    members = set()
+    assert tracker.mean() is None
+    for _ in range(300):
+        code = iso[rng.integers(30)]
+        if code in members and rng.random() < 0.5:
+            assert tracker.remove(code)
+            members.discard(code)
+        else:
+            assert tracker.add(code) == (code not in members)
+            members.add(code)
+        expected = brute_mean([lookup[c] for c in sorted(members)])
+        if expected is None:
+            assert tracker.mean() is None
+        else:
+            assert tracker.mean() == pytest.approx(expected, abs=1e-9)
+    assert not tracker.add('XXX')
+    assert not tracker.remove('XXX')
+
+
+def abs_matrix(values):
+    iso = [f"C{i:02d}" for i in range(len(values))]
+    return DistanceMatrix(iso, np.abs(values[:, None] - values[None, :]).astype(np.float32))
+
+
+def test_distance_matrix_mean_distance_matches_ideal_points():
+    values, membership = random_clubs(np.random.default_rng(6))
+    matrix = abs_matrix(values)
+    for club in range(membership.shape[1]):
+        rows = np.flatnonzero(membership[:, club])
+        expected = mean_pairwise_distance(values[rows])
+        if expected is None:
+            assert matrix.mean_distance(rows) is None
+        else:
+            assert matrix.mean_distance(rows) == pytest.approx(expected, rel=1e-5)
+
+
+def test_distance_matrix_club_means_matches_club_pair_distances():
+    values, membership = random_clubs(np.random.default_rng(7))
+    means, pairs = abs_matrix(values).club_means(membership)
+    expected_means, expected_pairs = club_pair_distances(values, membership)
+    np.testing.assert_array_equal(pairs, expected_pairs)
+    np.testing.assert_allclose(means, expected_means, rtol=1e-5)
+
+
+def test_distance_matrix_round_trip(tmp_path, monkeypatch):
+    monkeypatch.setattr(gs, 'DISTANCE_DIR', str(tmp_path))
+    values = np.random.default_rng(8).normal(size=12)
+    matrix = abs_matrix(values)
+    DistanceMatrix.write('votes', list(matrix.iso), matrix.values)
+    loaded = DistanceMatrix.load('votes')
+    assert list(loaded.iso) == list(matrix.iso)
+    np.testing.assert_array_equal(loaded.values, matrix.values)
+    assert 'votes' in gs.distance_sources()
+
+
+def test_distance_matrix_load_rejects_wrong_size(tmp_path, monkeypatch):
+    monkeypatch.setattr(gs, 'DISTANCE_DIR', str(tmp_path))
+    DistanceMatrix.write('votes', ['AAA', 'BBB', 'CCC'], np.zeros((3, 3)))
+    (tmp_path / 'votes.iso').write_text('AAA\nBBB\n')
+    with pytest.raises(ValueError):
+        DistanceMatrix.load('votes')
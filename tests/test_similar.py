@@ -0,0 +1,71 @@
+import numpy as np
+import pytest
+
+import green_swan_cluster_app as gs
+from green_swan_cluster_app import similar_countries
+
+FEATURES = ['Sovereign risk', 'Biocapacity', 'GCP_scaled', 'Vulnerability score_scaled']
+
+
+def brute_similar(features, iso, n_neighbors):
+    """Nearest distinct ISO codes by exhaustive Euclidean distance from the first `iso` row."""
+    X = gs.clustering_engine.matrix(tuple(sorted(features))).astype(np.float64)
+    codes = gs.cluster_iso
+    row = np.flatnonzero(codes == iso)[0]
+    distances = np.sqrt(((X - X[row]) ** 2).sum(axis=1))
+    result, seen = [], {iso}
+    for other in np.argsort(distances, kind='stable'):
+        if codes[other] not in seen:
+            seen.add(codes[other])
+            result.append((codes[other], distances[other]))
+    return result[:n_neighbors]
+
+
+@pytest.mark.parametrize('iso', ['KEN', 'DEU', 'NAM', 'BRA'])
+@pytest.mark.parametrize('n_neighbors', [1, 10, 50])
+def test_similar_countries_matches_brute_force(iso, n_neighbors):
+    result = similar_countries(FEATURES, iso, n_neighbors)
+    expected = brute_similar(FEATURES, iso, n_neighbors)
+    assert [r['distance'] for r in result] == pytest.approx([d for _, d in expected], abs=1e-4)
+    assert [r['ISO'] for r in result] == [code for code, _ in expected]
+
+
+def test_similar_countries_skips_self_and_duplicates():
+    # NAM has two rows in the country data
+    assert (gs.cluster_iso == 'NAM').sum() == 2
+    codes = [r['ISO'] for r in similar_countries(FEATURES, 'NAM', len(gs.cluster_iso))]
+    assert 'NAM' not in codes
+    assert len(codes) == len(set(codes)) == len(set(gs.cluster_iso)) - 1
+    neighbors = [r['ISO'] for r in similar_countries(FEATURES, 'ZAF', len(gs.cluster_iso))]
+    assert neighbors.count('NAM') == 1
+
+
+def test_similar_countries_unknown_iso():
+    assert similar_countries(FEATURES, 'ZZZ') is None
+
+
+@pytest.fixture(scope='module')
+def client():
+    return gs.app.server.test_client()
+
+
+def test_similar_api(client):
+    response = client.get(f"/api/similar?iso=ken&features={','.join(FEATURES)}&n=3")
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body['iso'] == 'KEN'
+    assert [r['ISO'] for r in body['neighbors']] == [r['ISO'] for r in similar_countries(FEATURES, 'KEN', 3)]
+
+
+@pytest.mark.parametrize('query', [
+    'iso=KEN&features=Biocapacity',
+    'iso=KEN&features=Biocapacity,Biocapacity',
+    'iso=KEN&features=Biocapacity,not_a_feature',
+    'iso=KEN',
+])
+def test_similar_api_rejects_bad_features(client, query):
+    assert client.get(f"/api/similar?{query}").status_code == 400
+
+
+def test_similar_api_unknown_iso(client):
+    assert client.get(f"/api/similar?iso=ZZZ&features={','.join(FEATURES)}").status_code == 404
@@ -0,0 +1,64 @@
+import itertools
+
+import numpy as np
+import pytest
+
+from green_swan_cluster_app import label_mapping, transition_counts
+
+
+def overlap(labels, reference, mapping):
+    return int((mapping[labels] == reference).sum())
+
+
+def best_overlap(labels, reference):
+    """Largest number of agreeing rows over all one-to-one label assignments."""
+    n_labels, n_ref = int(labels.max()) + 1, int(reference.max()) + 1
+    best = 0
+    for targets in itertools.permutations(range(max(n_labels, n_ref)), n_labels):
+        best = max(best, overlap(labels, reference, np.array(targets)))
+    return best
+
+
+def noisy_relabel(rng, reference, n_labels, noise=0.2):
+    labels = rng.permutation(n_labels)[reference % n_labels]
+    flip = rng.random(len(reference)) < noise
+    labels[flip] = rng.integers(n_labels, size=flip.sum())
+    return labels
+
+
+def test_label_mapping_recovers_permutation():
+    rng = np.random.default_rng(0)
+    reference = rng.integers(5, size=200)
+    perm = rng.permutation(5)
+    mapping = label_mapping(perm[reference], reference)
+    np.testing.assert_array_equal(mapping[perm[reference]], reference)
+
+
+@pytest.mark.parametrize('n_labels, n_ref', [(4, 4), (5, 3), (3, 5)])
+def test_label_mapping_is_optimal_and_one_to_one(n_labels, n_ref):
+    rng = np.random.default_rng(n_labels * 10 + n_ref)
+    reference = rng.integers(n_ref, size=150)
+    labels = noisy_relabel(rng, reference, n_labels)
+    labels[:n_labels] = np.arange(n_labels)
+    mapping = label_mapping(labels, reference)
+    assert len(set(mapping.tolist())) == n_labels
+    assert overlap(labels, reference, mapping) == best_overlap(labels, reference)
+
+
+def test_label_mapping_extra_labels_take_smallest_free_ids():
+    rng = np.random.default_rng(1)
+    reference = rng.integers(3, size=150)
+    labels = noisy_relabel(rng, reference, 5)
+    labels[:5] = np.arange(5)
+    mapping = label_mapping(labels, reference)
+    assert sorted(mapping.tolist()) == [0, 1, 2, 3, 4]
+
+
+def test_transition_counts_matches_crosstab():
+    rng = np.random.default_rng(2)
+    source = rng.integers(-1, 4, size=300)
+    target = rng.integers(-1, 6, size=300)
+    counts = transition_counts(source, target)
+    assert counts.shape == (6, 6)
+    for a, b in itertools.product(range(6), repeat=2):
+        assert counts[a, b] == sum(1 for s, t in zip(source, target) if s == a and t == b)